@@ -0,0 +1,65 @@
+"""
+Retrieval latency of a session document index at a given number of chunks.
+
+Builds an on-disk index from random unit vectors (no Ollama needed) and times
+top-k searches, excluding the query embedding request:
+
+    python benchmarks/document_retrieval.py --chunks 5000 --dim 768
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.chat.documents import DocumentIndex  # noqa: E402
+
+
+def run(chunks: int, dim: int, documents: int, searches: int, k: int) -> None:
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = DocumentIndex(os.path.join(tmp, "index"))
+        per_document = max(1, chunks // documents)
+        start = time.perf_counter()
+        for i in range(documents):
+            vectors = rng.standard_normal((per_document, dim), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            texts = [f"document {i} chunk {j} " * 40 for j in range(per_document)]
+            index.append(f"doc-{i}.txt", f"sha-{i}", texts, vectors)
+        build_seconds = time.perf_counter() - start
+
+        timings = []
+        for _ in range(searches):
+            query = rng.standard_normal(dim, dtype=np.float32)
+            start = time.perf_counter()
+            index.search(query, k)
+            timings.append(time.perf_counter() - start)
+        index.close()
+
+    timings.sort()
+    print(f"chunks:       {len(index)} x {dim} in {documents} documents")
+    print(f"build:        {build_seconds:.2f} s")
+    print(f"searches:     {searches} (top {k})")
+    print(f"latency p50:  {statistics.median(timings) * 1000:.2f} ms")
+    print(f"latency p95:  {timings[int(len(timings) * 0.95) - 1] * 1000:.2f} ms")
+    print(f"latency max:  {timings[-1] * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+    run(args.chunks, args.dim, args.documents, args.searches, args.k)
+
+
+if __name__ == "__main__":
+    main()
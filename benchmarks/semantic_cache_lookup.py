@@ -0,0 +1,71 @@
+"""
+Lookup latency of the semantic response cache at a given number of entries.
+
+Fills the cache with random unit vectors (no Ollama needed) and times lookups
+for both hits and misses:
+
+    python benchmarks/semantic_cache_lookup.py --entries 100000 --dim 768
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.chat.semantic_cache import SemanticCache, cache_scope  # noqa: E402
+
+
+def run(entries: int, dim: int, lookups: int, scopes: int, mmap: bool) -> None:
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((entries, dim), dtype=np.float32)
+    scope_ids = [cache_scope(f"model-{i}") for i in range(scopes)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "semantic_cache") if mmap else None
+        cache = SemanticCache(capacity=entries, threshold=0.95, path=path)
+        start = time.perf_counter()
+        for i, vector in enumerate(vectors):
+            cache.add(vector, scope_ids[i % scopes], f"answer {i}")
+        fill_seconds = time.perf_counter() - start
+
+        timings = []
+        hits = 0
+        for i in range(lookups):
+            if i % 2:
+                index = int(rng.integers(entries))
+                query = vectors[index] + rng.standard_normal(dim, dtype=np.float32) * 0.01
+                scope = scope_ids[index % scopes]
+            else:
+                query = rng.standard_normal(dim, dtype=np.float32)
+                scope = scope_ids[0]
+            start = time.perf_counter()
+            hits += cache.lookup(query, scope) is not None
+            timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    print(f"entries:      {entries} x {dim} ({'memmap' if mmap else 'in-memory'})")
+    print(f"fill:         {fill_seconds:.2f} s")
+    print(f"lookups:      {lookups} ({hits} hits)")
+    print(f"latency p50:  {statistics.median(timings) * 1000:.2f} ms")
+    print(f"latency p95:  {timings[int(len(timings) * 0.95) - 1] * 1000:.2f} ms")
+    print(f"latency max:  {timings[-1] * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--scopes", type=int, default=4)
+    parser.add_argument("--mmap", action="store_true", help="back the vectors with a memory-mapped file")
+    args = parser.parse_args()
+    run(args.entries, args.dim, args.lookups, args.scopes, args.mmap)
+
+
+if __name__ == "__main__":
+    main()
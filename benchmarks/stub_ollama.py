@@ -0,0 +1,80 @@
+"""
+Minimal stand-in for the Ollama API, for benchmarking the app without a model.
+
+Streams a fixed number of tokens for /api/generate and /api/chat, with an
+optional delay per token, and answers /api/tags and /api/show:
+
+    python benchmarks/stub_ollama.py --port 11434 --tokens 200
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubOllama(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    tokens = 200
+    delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, payload: dict) -> None:
+        line = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+
+    def do_GET(self):
+        self._send_json({"models": [{"name": "stub:latest"}]})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/api/show":
+            self._send_json({"model_info": {}})
+            return
+        chat = self.path == "/api/chat"
+        count = min(self.tokens, request.get("options", {}).get("num_predict") or self.tokens)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i in range(count):
+                text = f" token{i}"
+                self._send_chunk({"message": {"role": "assistant", "content": text}} if chat else {"response": text})
+                if self.delay:
+                    time.sleep(self.delay)
+            self._send_chunk({
+                "done": True,
+                "done_reason": "stop",
+                "eval_count": count,
+                "eval_duration": 10 ** 8,
+                "prompt_eval_count": 10,
+                "prompt_eval_duration": 10 ** 7,
+            })
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--tokens", type=int, default=200, help="tokens streamed per request")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds between tokens")
+    args = parser.parse_args()
+    StubOllama.tokens, StubOllama.delay = args.tokens, args.delay
+    ThreadingHTTPServer((args.host, args.port), StubOllama).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+HTTP throughput benchmark for single- and multi-worker deployments.
+
+Spreads requests round-robin over one or more worker URLs and reports
+requests per second, so the same run can be repeated with WORKERS=1 and
+WORKERS=N to compare. By default every request is a full generation through
+the streams API (POST /api/streams, then reading its SSE stream to the end),
+so it exercises the same producer, buffering and parsing path as a chat turn.
+Run the app against benchmarks/stub_ollama.py to measure the app rather than
+the model, with ADMIN_TOKEN set and MAX_CONCURRENT_STREAMS >= --concurrency:
+
+    python benchmarks/stub_ollama.py --port 11500 &
+    OLLAMA_BASE_URL=http://localhost:11500 ADMIN_TOKEN=bench MAX_CONCURRENT_STREAMS=64 WORKERS=2 python -m src.main &
+    python benchmarks/throughput.py --token bench --urls http://localhost:8000 http://localhost:8001
+
+--path benchmarks a plain GET endpoint instead.
+"""
+import argparse
+import itertools
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import requests
+
+
+def generate(session: requests.Session, url: str, token: str, model: str, prompt: str) -> int:
+    """Start a generation through the streams API and read it to the end; returns the chunk count."""
+    headers = {"X-Admin-Token": token}
+    response = session.post(f"{url}/api/streams", json={"model": model, "prompt": prompt}, headers=headers, timeout=30)
+    response.raise_for_status()
+    stream_id = response.json()["stream_id"]
+    chunks = 0
+    with session.get(f"{url}/api/streams/{stream_id}", headers=headers, stream=True, timeout=60) as events:
+        events.raise_for_status()
+        event = None
+        for line in events.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                if event in ("error", "expired"):
+                    raise RuntimeError(json.loads(line[len("data: "):]).get("detail"))
+                if event is None:
+                    chunks += 1
+            elif not line:
+                event = None
+    return chunks
+
+
+def run(urls, path: Optional[str], total: int, concurrency: int, token: str, model: str) -> None:
+    targets = itertools.cycle(urls)
+    lock = threading.Lock()
+    local = threading.local()
+    latencies = []
+    errors = 0
+    chunks = 0
+
+    def one_request(i):
+        nonlocal errors, chunks
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        with lock:
+            url = next(targets)
+        start = time.perf_counter()
+        received = 0
+        try:
+            if path:
+                session.get(f"{url}{path}", timeout=30).raise_for_status()
+            else:
+                # A distinct prompt per request, so no request reattaches to another's stream
+                received = generate(session, url, token, model, f"Benchmark request {i}")
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            chunks += received
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_request, range(total)))
+    elapsed = time.perf_counter() - start
+
+    print(f"workers:      {len(urls)}")
+    print(f"requests:     {total} ({errors} errors)")
+    print(f"throughput:   {len(latencies) / elapsed:.1f} req/s")
+    if chunks:
+        print(f"chunks:       {chunks / elapsed:.0f} chunks/s")
+    if latencies:
+        latencies.sort()
+        print(f"latency p50:  {statistics.median(latencies) * 1000:.1f} ms")
+        print(f"latency p95:  {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--urls", nargs="+", default=["http://localhost:8000"])
+    parser.add_argument("--path", help="GET this path instead of running generations")
+    parser.add_argument("--token", default="", help="ADMIN_TOKEN of the app, for the streams API")
+    parser.add_argument("--model", default="stub:latest")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    run(args.urls, args.path, args.requests, args.concurrency, args.token, args.model)
+
+
+if __name__ == "__main__":
+    main()
@@ -22,9 +22,12 @@ def create_app() -> FastAPI:
     )
     
     # Register routes
-    from .routes import cookies, health
+    from .routes import admin, cookies, health, metrics, streams
+    app.include_router(admin.router)
     app.include_router(cookies.router)
     app.include_router(health.router)
+    app.include_router(metrics.router)
+    app.include_router(streams.router)
     
     # Root endpoint
     @app.get("/")
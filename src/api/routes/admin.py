@@ -0,0 +1,77 @@
+"""
+Admin endpoints, enabled only when ADMIN_TOKEN is configured.
+"""
+import secrets
+import time
+from contextlib import nullcontext
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from src.chat.governor import governor
+from src.config import config
+from src.utils.profiling import (
+    ProfilingBusyError,
+    dump_pstats,
+    format_pstats,
+    profile_requests,
+    sample_stacks,
+    track_allocations,
+)
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """Reject requests without the configured admin token."""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/sessions")
+async def session_usage():
+    """Per-session memory and stream usage tracked by the resource governor."""
+    return governor.report()
+
+@router.post("/profile")
+def profile(
+    mode: str = Query("sample", pattern="^(sample|cprofile)$"),
+    seconds: float = Query(10.0, gt=0),
+    requests: int = Query(1, ge=1),
+    interval_ms: float = Query(10.0, gt=0),
+    allocations: bool = False,
+    top: int = Query(25, ge=1, le=500),
+    format: str = Query("json", pattern="^(json|pstats)$"),
+):
+    """
+    Profile the live process.
+
+    mode=sample samples every thread's stack for `seconds` and returns collapsed
+    stacks; mode=cprofile profiles the next `requests` chat responses (or until
+    `seconds` pass), including the threads streaming their answers from Ollama,
+    and returns pstats output, or the raw pstats dump with
+    format=pstats. allocations=true adds a tracemalloc top-N of the streaming path.
+    """
+    if not config.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    seconds = min(seconds, config.PROFILING_MAX_SECONDS)
+    started = time.perf_counter()
+    try:
+        with track_allocations(top) if allocations else nullcontext([]) as allocation_stats:
+            if mode == "sample":
+                result = {"collapsed_stacks": sample_stacks(seconds, interval_ms / 1000)}
+            else:
+                session = profile_requests(requests, seconds)
+                if format == "pstats":
+                    return Response(
+                        content=dump_pstats(session),
+                        media_type="application/octet-stream",
+                        headers={"Content-Disposition": "attachment; filename=chat.pstats"}
+                    )
+                result = {"requests_profiled": session.completed, "pstats": format_pstats(session, limit=top)}
+    except ProfilingBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "mode": mode,
+        "duration_seconds": round(time.perf_counter() - started, 3),
+        **result,
+        "allocations": allocation_stats,
+    }
@@ -1,6 +1,7 @@
 """
 Health check endpoints for monitoring and Docker health checks.
 """
+import os
 from fastapi import APIRouter
 from datetime import datetime
 
@@ -12,6 +13,7 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "ollama-chat",
+        "worker": os.getenv("WORKER_ID", "0"),
         "timestamp": datetime.utcnow().isoformat()
     }
 
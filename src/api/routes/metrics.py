@@ -0,0 +1,12 @@
+"""
+Application metrics endpoint.
+"""
+from fastapi import APIRouter
+from src.utils.metrics import metrics
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/api/metrics")
+async def get_metrics():
+    """Counters and recent latency summaries collected by the chat pipeline."""
+    return metrics.snapshot()
@@ -0,0 +1,80 @@
+"""
+Resumable generation streams over Server-Sent Events.
+
+POST /api/streams starts a generation and returns its stream ID; GET
+/api/streams/{stream_id} streams the chunks as SSE events whose IDs are chunk
+offsets, so a reconnecting client resumes with ?offset=N or Last-Event-ID.
+Like the admin endpoints, these require the X-Admin-Token header.
+"""
+import json
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from src.api.routes.admin import require_admin
+from src.chat.governor import ServerBusyError, governor
+from src.chat.stream_buffer import StreamBuffer, StreamExpiredError, ollama_chunks, stream_key, stream_registry
+from src.chat.thinking_budget import budget_for
+from src.clients.ollama import OllamaClient
+
+router = APIRouter(prefix="/api/streams", tags=["streams"], dependencies=[Depends(require_admin)])
+
+class StreamRequest(BaseModel):
+    model: str
+    prompt: str = ""
+    messages: Optional[List[dict]] = None
+    options: dict = {}
+    session_id: Optional[str] = None
+
+@router.post("")
+def start_stream(body: StreamRequest):
+    """Start a generation, or reattach to an identical one from the same session that is still buffered."""
+    if not body.prompt and not body.messages:
+        raise HTTPException(status_code=422, detail="Either prompt or messages is required")
+    options = governor.limit_options(body.options)
+    key = stream_key(body.model, body.prompt, body.messages, options, body.session_id)
+    buffer = stream_registry.resume(key)
+    if buffer is None:
+        client = OllamaClient()
+        deadline = governor.stream_deadline()
+        budget = budget_for(body.model)
+        try:
+            buffer = stream_registry.start(key, lambda: ollama_chunks(
+                client, body.model, body.prompt, messages=body.messages, options=options, deadline=deadline, budget=budget
+            ), session_id=body.session_id)
+        except ServerBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    return buffer.to_dict()
+
+@router.get("/{stream_id}")
+def read_stream(
+    stream_id: str,
+    offset: Optional[int] = Query(None, ge=0),
+    last_event_id: Optional[str] = Header(default=None)
+):
+    """Stream buffered and new chunks from an offset as SSE; 410 if the offset was dropped."""
+    buffer = stream_registry.get(stream_id)
+    if buffer is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired stream")
+    if offset is None:
+        offset = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+    if offset < buffer.base_offset:
+        raise HTTPException(status_code=410, detail=f"Offsets before {buffer.base_offset} are no longer buffered")
+    return StreamingResponse(
+        _events(buffer, offset),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _events(buffer: StreamBuffer, offset: int):
+    try:
+        for chunk_offset, chunk in buffer.read(offset):
+            yield f"id: {chunk_offset}\ndata: {json.dumps({'text': chunk})}\n\n"
+    except StreamExpiredError as e:
+        yield f"event: expired\ndata: {json.dumps({'detail': str(e)})}\n\n"
+        return
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+        return
+    final = {key: value for key, value in buffer.final.items() if key not in ("response", "message", "context")}
+    yield f"event: done\ndata: {json.dumps(final)}\n\n"
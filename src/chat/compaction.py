@@ -0,0 +1,201 @@
+"""
+Background history compaction.
+
+Once a session's conversation passes COMPACTION_TRIGGER_TOKENS, a daemon thread
+waits until the session has been idle for COMPACTION_IDLE_SECONDS and then
+summarizes the oldest turns with COMPACTION_MODEL. On later turns the summarized
+turns are replaced in the prompt by a single system message, while the chat
+history shown in the UI keeps the original turns.
+"""
+import hashlib
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+import gradio as gr
+
+from src.chat.governor import governor
+from src.chat.utils import approximate_token_count, flatten_history
+from src.clients.ollama import OllamaClient
+from src.config import config
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below for an assistant that will continue it. "
+    "Keep every fact, name, number, decision, code identifier and open question. "
+    "Write compact bullet points and do not add anything that was not said.\n\n"
+)
+
+
+def _prompt_messages(messages: List[gr.ChatMessage]) -> List[gr.ChatMessage]:
+    """Messages that end up in the prompt: text content, no thinking/metadata entries."""
+    return [m for m in messages if not m.metadata and isinstance(m.content, str)]
+
+
+def _fingerprint(messages: List[gr.ChatMessage]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for m in messages:
+        digest.update(f"{m.role}\0{m.content}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CompactionRecord:
+    """Summary standing in for the first `covered` prompt messages of a session."""
+
+    def __init__(self, covered: int, fingerprint: str, summary: str):
+        self.covered = covered
+        self.fingerprint = fingerprint
+        self.summary = summary
+
+
+class CompactionWorker:
+    """Summarizes old turns off the request path, while sessions are idle."""
+
+    def __init__(self):
+        self.client = OllamaClient()
+        self._records: Dict[str, CompactionRecord] = {}
+        self._pending: Dict[str, List[gr.ChatMessage]] = {}
+        self._last_activity: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def apply(
+        self,
+        session_id: Optional[str],
+        history: Optional[List[Union[gr.ChatMessage, dict, list]]],
+        record_usage: bool = True
+    ) -> List[Union[gr.ChatMessage, dict, list]]:
+        """
+        Replace already summarized turns at the start of the history with their summary.
+
+        record_usage=False builds the same history for a prefill without counting it as a turn.
+        """
+        history = list(history or [])
+        if session_id is None:
+            return history
+        with self._lock:
+            if record_usage:
+                self._last_activity[session_id] = time.time()
+            record = self._records.get(session_id)
+        if record is None:
+            return history
+
+        messages = flatten_history(history)
+        seen = 0
+        cut = None
+        for index, message in enumerate(messages):
+            if not message.metadata and isinstance(message.content, str):
+                seen += 1
+                if seen == record.covered:
+                    cut = index + 1
+                    break
+        if cut is None or _fingerprint(_prompt_messages(messages[:cut])) != record.fingerprint:
+            return history
+
+        if record_usage:
+            summarized_tokens = sum(approximate_token_count(m.content) for m in _prompt_messages(messages[:cut]))
+            metrics.observe("compaction.tokens_saved", summarized_tokens - approximate_token_count(record.summary))
+        summary = gr.ChatMessage(content=f"{SUMMARY_PREFIX}{record.summary}", role="system")
+        return [summary] + messages[cut:]
+
+    def observe(
+        self,
+        session_id: Optional[str],
+        history: Optional[List[Union[gr.ChatMessage, dict, list]]],
+        user_message: str,
+        answer: str
+    ) -> None:
+        """Queue the session for compaction after a finished turn if it has grown too long."""
+        if session_id is None:
+            return
+        messages = _prompt_messages(flatten_history(list(history or [])))
+        messages.append(gr.ChatMessage(content=user_message, role="user"))
+        messages.append(gr.ChatMessage(content=answer, role="assistant"))
+        tokens = sum(approximate_token_count(m.content) for m in messages)
+        with self._lock:
+            self._last_activity[session_id] = time.time()
+            if tokens < config.COMPACTION_TRIGGER_TOKENS:
+                return
+            self._pending[session_id] = messages
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history-compaction", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def forget(self, session_id: str) -> None:
+        """Drop all compaction state for a session."""
+        with self._lock:
+            self._records.pop(session_id, None)
+            self._pending.pop(session_id, None)
+            self._last_activity.pop(session_id, None)
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(timeout=1.0)
+            self._wakeup.clear()
+            now = time.time()
+            with self._lock:
+                due = [
+                    session_id for session_id in self._pending
+                    if now - self._last_activity.get(session_id, 0) >= config.COMPACTION_IDLE_SECONDS
+                ]
+            for session_id in due:
+                if governor.is_streaming(session_id):
+                    continue
+                with self._lock:
+                    messages = self._pending.pop(session_id, None)
+                    record = self._records.get(session_id)
+                if messages is None:
+                    continue
+                try:
+                    self._compact(session_id, messages, record)
+                except Exception as e:
+                    metrics.increment("compaction.failed")
+                    logger.error(f"History compaction failed for session {session_id}: {str(e)}")
+
+    def _compact(self, session_id: str, messages: List[gr.ChatMessage], record: Optional[CompactionRecord]) -> None:
+        """Summarize all but the most recent COMPACTION_KEEP_RECENT_TOKENS of the conversation."""
+        kept_tokens = 0
+        keep = 0
+        for message in reversed(messages):
+            tokens = approximate_token_count(message.content)
+            if keep >= 2 and kept_tokens + tokens > config.COMPACTION_KEEP_RECENT_TOKENS:
+                break
+            kept_tokens += tokens
+            keep += 1
+        covered = len(messages) - keep
+        extends_record = record is not None and _fingerprint(messages[:record.covered]) == record.fingerprint
+        if covered < 2 or (extends_record and covered <= record.covered):
+            return
+
+        if extends_record:
+            earlier = f"{SUMMARY_PREFIX}{record.summary}\n\n"
+            to_summarize = messages[record.covered:covered]
+        else:
+            earlier = ""
+            to_summarize = messages[:covered]
+        transcript = "\n".join(f"{m.role}: {m.content}" for m in to_summarize)
+
+        started = time.perf_counter()
+        summary = self.client.generate(
+            config.COMPACTION_MODEL,
+            f"{SUMMARY_INSTRUCTIONS}{earlier}{transcript}",
+            timeout=config.COMPACTION_TIMEOUT
+        ).strip()
+        if config.THINK_END_TAG in summary:
+            summary = summary.split(config.THINK_END_TAG, 1)[1].strip()
+        if not summary:
+            return
+        metrics.increment("compaction.runs")
+        metrics.observe("compaction.duration_seconds", time.perf_counter() - started)
+        with self._lock:
+            self._records[session_id] = CompactionRecord(covered, _fingerprint(messages[:covered]), summary)
+        logger.info(f"Compacted {covered} messages of session {session_id} into a {len(summary)} character summary")
+
+
+compaction_worker = CompactionWorker()
+governor.on_evict(compaction_worker.forget)
@@ -0,0 +1,265 @@
+"""
+Documents attached to a chat session, retrieved by similarity on every turn.
+
+Files are read, chunked and embedded once, in a process pool. Each session's
+index lives in its own directory under DOCUMENTS_DIR: chunk text is appended to
+text.bin, normalized vectors to vectors.f32 and (document, start, end) byte
+offsets to offsets.i64, all three memory-mapped for reading. Retrieval is a
+single matrix-vector product and an argpartition over the session's chunks, so
+only the top DOCUMENT_TOP_K chunks reach the prompt instead of whole documents.
+
+A session's directory is deleted when the governor evicts the session. Index
+directories not touched for SESSION_IDLE_SECONDS and not held by this process,
+such as those left behind by a restart, are swept at startup and on every attach.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.chat.governor import governor
+from src.chat.ingest import TEXT_EXTENSIONS, embed_document, file_digest
+from src.clients.ollama import OllamaClient
+from src.config import config
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+CONTEXT_HEADER = "Excerpts from the user's documents. Use them when they are relevant to the question:"
+
+
+class DocumentIndex:
+    """Append-only, memory-mapped chunk index for one session."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.documents: List[dict] = []
+        self.dim: Optional[int] = None
+        self.count = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._text: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        if os.path.exists(self._path("meta.json")):
+            with open(self._path("meta.json")) as f:
+                meta = json.load(f)
+            self.documents, self.dim, self.count = meta["documents"], meta["dim"], meta["count"]
+            self._open()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def has(self, digest: str) -> bool:
+        return any(document["sha256"] == digest for document in self.documents)
+
+    def append(self, name: str, digest: str, chunks: List[str], vectors: np.ndarray) -> None:
+        """Add a document's chunks and vectors to the end of the index files."""
+        if not chunks:
+            return
+        with self._lock:
+            if self.dim is not None and vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding size {vectors.shape[1]} does not match the index ({self.dim})")
+            os.makedirs(self.directory, exist_ok=True)
+            encoded = [chunk.encode("utf-8") for chunk in chunks]
+            text_path = self._path("text.bin")
+            position = os.path.getsize(text_path) if os.path.exists(text_path) else 0
+            offsets = np.empty((len(encoded), 3), dtype=np.int64)
+            offsets[:, 0] = len(self.documents)
+            for i, data in enumerate(encoded):
+                offsets[i, 1:] = (position, position + len(data))
+                position += len(data)
+
+            with open(text_path, "ab") as f:
+                f.write(b"".join(encoded))
+            with open(self._path("vectors.f32"), "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            with open(self._path("offsets.i64"), "ab") as f:
+                f.write(offsets.tobytes())
+
+            self.dim = vectors.shape[1]
+            self.count += len(encoded)
+            self.documents.append({"name": name, "sha256": digest, "chunks": len(encoded)})
+            with open(self._path("meta.json"), "w") as f:
+                json.dump({"dim": self.dim, "count": self.count, "documents": self.documents}, f)
+            self._open()
+        self.touch()
+
+    def touch(self) -> None:
+        """Mark the index as in use, so the stale-directory sweep leaves it alone."""
+        try:
+            os.utime(self.directory)
+        except OSError:
+            pass
+
+    def _open(self) -> None:
+        """(Re)map the index files after they have grown."""
+        if not self.count:
+            return
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(self.count, self.dim))
+        self._offsets = np.memmap(self._path("offsets.i64"), dtype=np.int64, mode="r", shape=(self.count, 3))
+        self._text = np.memmap(self._path("text.bin"), dtype=np.uint8, mode="r")
+
+    def search(self, embedding: Sequence[float], k: int) -> List[Tuple[str, str, float]]:
+        """Return (document name, chunk text, score) of the k most similar chunks, best first."""
+        with self._lock:
+            if not self.count:
+                return []
+            query = np.asarray(embedding, dtype=np.float32)
+            if query.shape[0] != self.dim:
+                return []
+            norm = np.linalg.norm(query)
+            scores = self._vectors @ (query / norm if norm else query)
+            k = min(k, self.count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for row in top:
+                document, start, end = self._offsets[row]
+                text = self._text[start:end].tobytes().decode("utf-8", errors="replace")
+                results.append((self.documents[document]["name"], text, float(scores[row])))
+            return results
+
+    def close(self) -> None:
+        with self._lock:
+            self._vectors = self._offsets = self._text = None
+
+
+class DocumentStore:
+    """Per-session document indexes and the process pool that builds them."""
+
+    def __init__(self, directory: str = config.DOCUMENTS_DIR):
+        self.directory = directory
+        self._indexes: Dict[str, DocumentIndex] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.sweep()
+
+    def _index(self, session_id: str) -> DocumentIndex:
+        with self._lock:
+            index = self._indexes.get(session_id)
+            if index is None:
+                name = hashlib.blake2b(session_id.encode("utf-8"), digest_size=16).hexdigest()
+                index = DocumentIndex(os.path.join(self.directory, name))
+                self._indexes[session_id] = index
+            return index
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=config.DOCUMENT_INGEST_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def has_documents(self, session_id: Optional[str]) -> bool:
+        if session_id is None:
+            return False
+        index = self._indexes.get(session_id)
+        return index is not None and len(index) > 0
+
+    def documents(self, session_id: Optional[str]) -> List[dict]:
+        index = self._indexes.get(session_id) if session_id else None
+        return list(index.documents) if index else []
+
+    def attach(self, session_id: str, paths: List[str]) -> List[str]:
+        """Chunk and embed new documents for a session; returns the names of those added."""
+        governor.touch(session_id)
+        self.sweep()
+        index = self._index(session_id)
+        pending = {}
+        for path in paths:
+            name = os.path.basename(path)
+            if os.path.splitext(path)[1].lower() not in TEXT_EXTENSIONS:
+                logger.warning(f"Skipping unsupported document {name}")
+                continue
+            digest = file_digest(path)
+            if index.has(digest) or digest in pending:
+                continue
+            pending[digest] = (name, path)
+        if not pending:
+            return []
+
+        started = time.perf_counter()
+        pool = self._pool()
+        futures = {digest: pool.submit(embed_document, path) for digest, (_, path) in pending.items()}
+        added = []
+        for digest, future in futures.items():
+            name = pending[digest][0]
+            try:
+                chunks, vectors = future.result()
+                index.append(name, digest, chunks, vectors)
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    with self._lock:
+                        if self._executor is pool:
+                            self._executor = None
+                metrics.increment("documents.failed")
+                logger.error(f"Failed to ingest document {name}: {str(e)}")
+                continue
+            metrics.increment("documents.chunks", len(chunks))
+            added.append(name)
+        metrics.observe("documents.ingest_seconds", time.perf_counter() - started)
+        logger.info(f"Ingested {len(added)} documents for session {session_id} ({len(index)} chunks in total)")
+        return added
+
+    def retrieve(self, session_id: str, client: OllamaClient, query: str, k: int = config.DOCUMENT_TOP_K):
+        """The k chunks of a session's documents most relevant to the query."""
+        index = self._indexes.get(session_id)
+        if index is None or not len(index):
+            return []
+        index.touch()
+        embedding = client.embed(config.EMBEDDING_MODEL, query)
+        started = time.perf_counter()
+        results = index.search(embedding, k)
+        metrics.observe("documents.search_seconds", time.perf_counter() - started)
+        return results
+
+    def forget(self, session_id: str) -> None:
+        """Drop a session's index and delete its files."""
+        with self._lock:
+            index = self._indexes.pop(session_id, None)
+        if index is None:
+            return
+        index.close()
+        shutil.rmtree(index.directory, ignore_errors=True)
+
+    def sweep(self) -> None:
+        """Delete index directories of sessions that are gone, including ones from before a restart."""
+        if not os.path.isdir(self.directory):
+            return
+        with self._lock:
+            live = {index.directory for index in self._indexes.values()}
+        cutoff = time.time() - config.SESSION_IDLE_SECONDS
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stale = path not in live and os.path.isdir(path) and os.path.getmtime(path) < cutoff
+            except OSError:
+                continue
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+                metrics.increment("documents.stale_indexes_removed")
+
+
+def with_document_context(custom_instructions: str, results: List[Tuple[str, str, float]]) -> str:
+    """Append retrieved chunks to the system instructions."""
+    if not results:
+        return custom_instructions
+    excerpts = "\n\n".join(f"[{name}]\n{text.strip()}" for name, text, _ in results)
+    context = f"{CONTEXT_HEADER}\n\n{excerpts}"
+    return f"{custom_instructions}\n\n{context}" if custom_instructions else context
+
+
+document_store = DocumentStore()
+governor.on_evict(document_store.forget)
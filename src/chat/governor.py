@@ -0,0 +1,225 @@
+"""
+Resource governor bounding concurrent streams, per-session history and idle sessions.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Union
+
+import gradio as gr
+
+from src.config import config
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class ServerBusyError(Exception):
+    """Raised when every stream slot is taken."""
+
+
+class SessionUsage:
+    """Resource usage tracked for one browser session."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.history_bytes = 0
+        self.history_messages = 0
+        self.trimmed_messages = 0
+        self.active_streams = 0
+        self.turns = 0
+        self.last_active = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "history_bytes": self.history_bytes,
+            "history_messages": self.history_messages,
+            "trimmed_messages": self.trimmed_messages,
+            "active_streams": self.active_streams,
+            "turns": self.turns,
+            "idle_seconds": round(time.time() - self.last_active, 1),
+        }
+
+
+def message_bytes(msg: Union[gr.ChatMessage, dict, list]) -> int:
+    """Approximate the memory held by a history entry from its serialized content."""
+    if isinstance(msg, list):
+        return sum(message_bytes(m) for m in msg)
+    content = msg.get("content", "") if isinstance(msg, dict) else msg.content
+    if not isinstance(content, str):
+        content = json.dumps(content, default=str)
+    return len(content.encode("utf-8"))
+
+
+class ResourceGovernor:
+    """Caps concurrent streams and history size, and evicts idle sessions in LRU order."""
+
+    def __init__(self):
+        self._slots = threading.BoundedSemaphore(config.MAX_CONCURRENT_STREAMS)
+        self._active_streams = 0
+        self._sessions: "OrderedDict[str, SessionUsage]" = OrderedDict()
+        self._evict_callbacks: List[Callable[[str], None]] = []
+        self._evicted: List[str] = []
+        self._lock = threading.Lock()
+
+    def on_evict(self, callback: Callable[[str], None]) -> None:
+        """Register a callback that frees per-session state when a session is evicted."""
+        self._evict_callbacks.append(callback)
+
+    def touch(self, session_id: str) -> None:
+        """Mark a session as active outside of a chat turn, e.g. when it attaches documents."""
+        with self._lock:
+            self._touch(session_id)
+        self._run_evict_callbacks()
+
+    def trim_history(
+        self,
+        session_id: Optional[str],
+        history: Optional[List[Union[gr.ChatMessage, dict, list]]]
+    ) -> List[Union[gr.ChatMessage, dict, list]]:
+        """Drop the oldest history entries until the session fits in MAX_HISTORY_BYTES."""
+        history = list(history or [])
+        sizes = [message_bytes(msg) for msg in history]
+        total = sum(sizes)
+        dropped = 0
+        while history and total > config.MAX_HISTORY_BYTES:
+            history.pop(0)
+            total -= sizes[dropped]
+            dropped += 1
+        if dropped:
+            metrics.increment("governor.history_trimmed", dropped)
+
+        if session_id is not None:
+            with self._lock:
+                usage = self._touch(session_id)
+                usage.history_bytes = total
+                usage.history_messages = len(history)
+                usage.trimmed_messages = dropped
+            self._run_evict_callbacks()
+        return history
+
+    @contextmanager
+    def stream_slot(self, session_id: Optional[str]):
+        """Hold one of MAX_CONCURRENT_STREAMS slots for the duration of a generation."""
+        if not self._slots.acquire(blocking=False):
+            metrics.increment("governor.rejected_streams")
+            raise ServerBusyError("Too many responses are being generated right now. Please retry shortly.")
+        with self._lock:
+            self._active_streams += 1
+            usage = self._touch(session_id) if session_id is not None else None
+            if usage is not None:
+                usage.active_streams += 1
+                usage.turns += 1
+        self._run_evict_callbacks()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active_streams -= 1
+                if usage is not None:
+                    usage.active_streams -= 1
+                    usage.last_active = time.time()
+            self._slots.release()
+
+    def is_streaming(self, session_id: str) -> bool:
+        """Whether a session currently has a generation in progress."""
+        with self._lock:
+            usage = self._sessions.get(session_id)
+            return usage is not None and usage.active_streams > 0
+
+    def stream_deadline(self) -> Optional[float]:
+        """Wall-clock time after which a generation is cut off, if MAX_STREAM_SECONDS is set."""
+        if config.MAX_STREAM_SECONDS <= 0:
+            return None
+        return time.time() + config.MAX_STREAM_SECONDS
+
+    def generation_options(self) -> dict:
+        """Ollama options enforcing the configured generation length cap."""
+        if config.MAX_NUM_PREDICT <= 0:
+            return {}
+        return {"num_predict": config.MAX_NUM_PREDICT}
+
+    def limit_options(self, options: Optional[dict]) -> dict:
+        """Client-supplied Ollama options with num_predict clamped to MAX_NUM_PREDICT."""
+        limited = dict(options or {})
+        if config.MAX_NUM_PREDICT > 0:
+            requested = limited.get("num_predict")
+            if not isinstance(requested, int) or not 0 < requested <= config.MAX_NUM_PREDICT:
+                limited["num_predict"] = config.MAX_NUM_PREDICT
+        return limited
+
+    def report(self) -> dict:
+        """Current usage for the admin endpoint."""
+        from src.chat.thinking_store import thinking_store
+
+        with self._lock:
+            self._evict()
+            sessions = [usage.to_dict() for usage in self._sessions.values()]
+            active_streams = self._active_streams
+        self._run_evict_callbacks()
+        return {
+            "active_streams": active_streams,
+            "max_concurrent_streams": config.MAX_CONCURRENT_STREAMS,
+            "sessions": sessions,
+            "history_bytes_total": sum(s["history_bytes"] for s in sessions),
+            "thinking_store_bytes": thinking_store.memory_bytes,
+            "max_rss_bytes": _max_rss_bytes(),
+        }
+
+    def _touch(self, session_id: str) -> SessionUsage:
+        usage = self._sessions.get(session_id)
+        if usage is None:
+            usage = self._sessions[session_id] = SessionUsage(session_id)
+        else:
+            self._sessions.move_to_end(session_id)
+        usage.last_active = time.time()
+        self._evict()
+        return usage
+
+    def _evict(self) -> None:
+        """
+        Evict idle sessions, oldest first, past SESSION_IDLE_SECONDS or MAX_SESSIONS.
+
+        Called with the lock held; evicted sessions are queued for
+        _run_evict_callbacks, which frees their state once the lock is released.
+        """
+        now = time.time()
+        for session_id in list(self._sessions):
+            usage = self._sessions[session_id]
+            over_capacity = len(self._sessions) > config.MAX_SESSIONS
+            idle = now - usage.last_active > config.SESSION_IDLE_SECONDS
+            if not (over_capacity or idle):
+                break
+            if usage.active_streams:
+                continue
+            del self._sessions[session_id]
+            metrics.increment("governor.sessions_evicted")
+            self._evicted.append(session_id)
+
+    def _run_evict_callbacks(self) -> None:
+        """Free the state of evicted sessions; may do disk I/O, so never called under the lock."""
+        with self._lock:
+            evicted, self._evicted = self._evicted, []
+        for session_id in evicted:
+            for callback in self._evict_callbacks:
+                try:
+                    callback(session_id)
+                except Exception as e:
+                    logger.error(f"Session eviction callback failed: {str(e)}")
+
+
+def _max_rss_bytes() -> Optional[int]:
+    """Peak resident memory of this process, where the platform reports it."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+governor = ResourceGovernor()
@@ -0,0 +1,123 @@
+"""
+Image pipeline for vision models: downscale, re-encode and cache images by content hash.
+
+Images are fitted to the vision encoder's input size reported by /api/show
+(image_size, times the tile grid for tiling models), capped at
+VISION_MAX_IMAGE_SIDE, which is also the size used when a model reports none.
+"""
+import base64
+import hashlib
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from src.config import config
+from src.utils.metrics import metrics
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp", ".tiff"}
+
+
+def file_path_from_content(content: Any) -> Optional[str]:
+    """Extract a file path from the shapes Gradio uses for file messages in the history."""
+    if isinstance(content, (tuple, list)) and content and isinstance(content[0], str):
+        return content[0]
+    if isinstance(content, dict):
+        if isinstance(content.get("path"), str):
+            return content["path"]
+        if isinstance(content.get("file"), dict):
+            return content["file"].get("path")
+    return getattr(getattr(content, "file", None), "path", None) or getattr(content, "path", None)
+
+
+def is_image_path(path: Optional[str]) -> bool:
+    return bool(path) and os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def image_side_for(model_info: dict) -> int:
+    """Longest image side a model's vision encoder takes, from its /api/show model_info."""
+    info = model_info.get("model_info") or {}
+    image_size = next((v for k, v in info.items() if k.endswith("vision.image_size") and isinstance(v, int)), None)
+    if not image_size:
+        return config.VISION_MAX_IMAGE_SIDE
+    tiles = next((v for k, v in info.items() if k.endswith("vision.max_num_tiles") and isinstance(v, int)), 1)
+    return min(image_size * max(1, math.isqrt(tiles)), config.VISION_MAX_IMAGE_SIDE)
+
+
+class ImageCache:
+    """
+    Base64 payloads of downscaled images keyed by the SHA-256 of the original bytes and the target size.
+
+    A second map from (path, size, mtime) to hash lets repeated turns skip even
+    reading the file, so an image is decoded and encoded once no matter how many
+    turns resend it.
+    """
+
+    def __init__(self, max_bytes: int = config.IMAGE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._encoded: "OrderedDict[str, str]" = OrderedDict()
+        self._hash_by_file: Dict[Tuple[str, int, float], str] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def encode(self, path: str, max_side: int = config.VISION_MAX_IMAGE_SIDE) -> str:
+        """Return the base64 payload for an image file at a size, encoding it on first use."""
+        stat = os.stat(path)
+        file_key = (path, stat.st_size, stat.st_mtime)
+        with self._lock:
+            digest = self._hash_by_file.get(file_key)
+            key = f"{digest}:{max_side}"
+            if digest is not None and key in self._encoded:
+                self._encoded.move_to_end(key)
+                metrics.increment("images.cache_hits")
+                return self._encoded[key]
+
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        key = f"{digest}:{max_side}"
+        with self._lock:
+            self._hash_by_file[file_key] = digest
+            encoded = self._encoded.get(key)
+            if encoded is not None:
+                self._encoded.move_to_end(key)
+                metrics.increment("images.cache_hits")
+                return encoded
+
+        encoded = base64.b64encode(downscale(data, max_side)).decode("ascii")
+        metrics.increment("images.encoded")
+        with self._lock:
+            if key not in self._encoded:
+                self._encoded[key] = encoded
+                self._bytes += len(encoded)
+                self._evict()
+            return self._encoded[key]
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and len(self._encoded) > 1:
+            key, encoded = self._encoded.popitem(last=False)
+            self._bytes -= len(encoded)
+            digest = key.split(":", 1)[0]
+            if any(k.startswith(f"{digest}:") for k in self._encoded):
+                continue
+            for file_key in [k for k, v in self._hash_by_file.items() if v == digest]:
+                del self._hash_by_file[file_key]
+
+
+def downscale(data: bytes, max_side: int = config.VISION_MAX_IMAGE_SIDE) -> bytes:
+    """Fit an image within max_side pixels and re-encode it as JPEG."""
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=config.VISION_JPEG_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+image_cache = ImageCache()
@@ -0,0 +1,74 @@
+"""
+Document ingestion run in worker processes: read, chunk and embed one file.
+
+Kept free of Gradio imports so spawned workers start quickly.
+"""
+import hashlib
+from typing import List, Tuple
+
+import numpy as np
+
+from src.clients.ollama import OllamaClient
+from src.config import config
+
+TEXT_EXTENSIONS = {
+    ".txt", ".md", ".markdown", ".rst", ".csv", ".tsv", ".json", ".yaml", ".yml", ".toml",
+    ".html", ".xml", ".log", ".py", ".js", ".ts", ".java", ".c", ".h", ".cpp", ".go", ".rs", ".sql",
+}
+
+EMBED_BATCH_SIZE = 64
+
+_client = None
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_spans(text: str, size: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    Split text into overlapping spans of at most size characters, preferring paragraph and sentence breaks.
+
+    The overlap is clamped to a quarter of the size so every span advances by at least that much.
+    """
+    size = max(size, 1)
+    overlap = min(max(overlap, 0), size // 4)
+    spans = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = text.rfind(separator, start + size // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        if text[start:end].strip():
+            spans.append((start, end))
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return spans
+
+
+def embed_document(path: str) -> Tuple[List[str], np.ndarray]:
+    """Chunk a text file and return its chunks with their normalized float32 embeddings."""
+    global _client
+    if _client is None:
+        _client = OllamaClient()
+    with open(path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    chunks = [text[start:end] for start, end in chunk_spans(text, config.DOCUMENT_CHUNK_CHARS, config.DOCUMENT_CHUNK_OVERLAP)]
+    vectors = []
+    for i in range(0, len(chunks), EMBED_BATCH_SIZE):
+        vectors.extend(_client.embed_batch(
+            config.EMBEDDING_MODEL, chunks[i:i + EMBED_BATCH_SIZE], timeout=config.DOCUMENT_EMBED_TIMEOUT
+        ))
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(chunks), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return chunks, matrix / norms
@@ -0,0 +1,136 @@
+"""
+Speculative prompt prefill while the user is typing.
+
+Each textbox change reschedules a debounced prefill for the session. When it
+fires, the conversation so far is sent to Ollama for prompt evaluation only, so
+the KV cache is warm by the time the real request arrives. A newer prefill for
+the same session closes the one still in flight.
+"""
+import json
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+
+from src.chat.governor import governor
+from src.clients.ollama import OllamaClient
+from src.config import config
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+
+class _SessionPrefill:
+    """Prefill bookkeeping for one browser session."""
+
+    def __init__(self):
+        self.generation = 0
+        self.timer: Optional[threading.Timer] = None
+        self.response: Optional[requests.Response] = None
+        self.response_model: Optional[str] = None
+        self.last_sent = 0.0
+        self.warmed_model: Optional[str] = None
+        self.warmed_at = 0.0
+
+
+class PrefillManager:
+    """Debounces, rate-limits and cancels speculative prefills per session."""
+
+    def __init__(self):
+        self.client = OllamaClient()
+        self._sessions: Dict[str, _SessionPrefill] = {}
+        self._lock = threading.Lock()
+
+    def schedule(self, session_id: str, model: str, prompt: str, options: Optional[dict] = None) -> None:
+        """Schedule a prefill, superseding any pending one for the session."""
+        with self._lock:
+            state = self._sessions.setdefault(session_id, _SessionPrefill())
+            state.generation += 1
+            if state.timer is not None:
+                state.timer.cancel()
+            wait_for_rate_limit = state.last_sent + config.PREFILL_MIN_INTERVAL_SECONDS - time.time()
+            delay = max(config.PREFILL_DEBOUNCE_SECONDS, wait_for_rate_limit)
+            state.timer = threading.Timer(delay, self._run, args=(session_id, state.generation, model, prompt, options))
+            state.timer.daemon = True
+            state.timer.start()
+
+    def consume(self, session_id: Optional[str], model: str) -> bool:
+        """Cancel any pending prefill and report whether the cache was warmed for this model."""
+        if session_id is None:
+            return False
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                return False
+            state.generation += 1
+            if state.timer is not None:
+                state.timer.cancel()
+                state.timer = None
+            in_flight = state.response is not None and state.response_model == model
+            warmed = (
+                state.warmed_model == model
+                and time.time() - state.warmed_at < config.PREFILL_MAX_AGE_SECONDS
+            )
+            state.warmed_model = None
+        return warmed or in_flight
+
+    def forget(self, session_id: str) -> None:
+        """Drop all prefill state for a session."""
+        with self._lock:
+            state = self._sessions.pop(session_id, None)
+        if state is not None:
+            if state.timer is not None:
+                state.timer.cancel()
+            if state.response is not None:
+                state.response.close()
+
+    def _run(self, session_id: str, generation: int, model: str, prompt: str, options: Optional[dict]) -> None:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None or state.generation != generation:
+                return
+            previous = state.response
+            state.last_sent = time.time()
+        if previous is not None:
+            previous.close()
+            metrics.increment("prefill.cancelled")
+
+        started = time.perf_counter()
+        try:
+            response = self.client.prefill(model, prompt, options)
+        except Exception as e:
+            logger.debug(f"Prefill failed for session {session_id}: {str(e)}")
+            metrics.increment("prefill.failed")
+            return
+
+        with self._lock:
+            state.response = response
+            state.response_model = model
+        metrics.increment("prefill.sent")
+        completed = False
+        try:
+            for line in response.iter_lines():
+                if state.response is not response:
+                    break
+                if line and json.loads(line).get("done"):
+                    completed = True
+        except Exception:
+            # Closed by a newer prefill for the same session
+            pass
+        finally:
+            response.close()
+
+        with self._lock:
+            if state.response is response:
+                state.response = None
+                state.response_model = None
+            if completed:
+                state.warmed_model = model
+                state.warmed_at = time.time()
+        if completed:
+            metrics.increment("prefill.completed")
+            metrics.observe("prefill.duration_seconds", time.perf_counter() - started)
+
+
+prefill_manager = PrefillManager()
+governor.on_evict(prefill_manager.forget)
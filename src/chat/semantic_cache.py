@@ -0,0 +1,160 @@
+"""
+Semantic response cache backed by a NumPy embedding matrix.
+
+Answers are stored next to the normalized embedding of the question that
+produced them. A lookup is a single matrix-vector product over all entries,
+masked to entries with the same scope (model and system instructions). With a
+path configured the vectors live in a memory-mapped file and the entries in an
+append-only JSONL log, so the cache survives restarts. Slots are numbered by
+the process that owns the files, so with WORKERS > 1 each worker persists to its
+own files, suffixed with its WORKER_ID.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from src.config import config
+from src.utils.logger import logger
+
+
+def cache_scope(model: str, custom_instructions: str = "") -> int:
+    """Stable 63-bit id for the (model, instructions) pair an answer is valid for."""
+    digest = hashlib.blake2b(f"{model}\0{custom_instructions}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") >> 1
+
+
+class SemanticCache:
+    """Size-bounded cache of answers keyed by question embeddings, evicting least recently used."""
+
+    def __init__(
+        self,
+        capacity: int = config.SEMANTIC_CACHE_CAPACITY,
+        threshold: float = config.SEMANTIC_CACHE_THRESHOLD,
+        path: Optional[str] = config.SEMANTIC_CACHE_PATH,
+    ):
+        self.capacity = capacity
+        self.threshold = threshold
+        if path and config.WORKERS > 1:
+            path = f"{path}.worker{os.getenv('WORKER_ID', '0')}"
+        self.path = path
+        self.dim: Optional[int] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._scopes = np.full(capacity, -1, dtype=np.int64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._answers: List[Optional[str]] = [None] * capacity
+        self._size = 0
+        self._lock = threading.Lock()
+        if self.path and os.path.exists(f"{self.path}.json"):
+            self._load()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def lookup(self, embedding: Sequence[float], scope: int) -> Optional[str]:
+        """Return the cached answer most similar to the embedding, if above the threshold."""
+        with self._lock:
+            if self._size == 0 or self._vectors is None:
+                return None
+            query = self._normalize(embedding)
+            if query.shape[0] != self.dim:
+                return None
+            scores = self._vectors[:self._size] @ query
+            scores[self._scopes[:self._size] != scope] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            self._last_used[best] = time.time()
+            return self._answers[best]
+
+    def add(self, embedding: Sequence[float], scope: int, answer: str) -> None:
+        """Store an answer, replacing the least recently used entry when full."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is None:
+                self._allocate(vector.shape[0])
+            elif vector.shape[0] != self.dim:
+                logger.warning(f"Ignoring embedding of size {vector.shape[0]}, cache uses {self.dim}")
+                return
+            if self._size < self.capacity:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+            self._vectors[slot] = vector
+            self._scopes[slot] = scope
+            self._answers[slot] = answer
+            self._last_used[slot] = time.time()
+            if self.path:
+                self._append_entry(slot, scope, answer)
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _allocate(self, dim: int) -> None:
+        """Create the vector matrix once the embedding size is known."""
+        self.dim = dim
+        if not self.path:
+            self._vectors = np.zeros((self.capacity, dim), dtype=np.float32)
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            # Never truncate vectors that another cache instance may be using.
+            with open(f"{self.path}.f32", "xb") as f:
+                f.truncate(self.capacity * dim * np.dtype(np.float32).itemsize)
+        except FileExistsError:
+            logger.warning(f"{self.path}.f32 already exists, keeping the semantic cache in memory")
+            self.path = None
+            self._vectors = np.zeros((self.capacity, dim), dtype=np.float32)
+            return
+        self._vectors = np.memmap(f"{self.path}.f32", dtype=np.float32, mode="r+", shape=(self.capacity, dim))
+        with open(f"{self.path}.json", "w") as f:
+            json.dump({"capacity": self.capacity, "dim": dim}, f)
+        open(f"{self.path}.entries.jsonl", "w").close()
+
+    def _append_entry(self, slot: int, scope: int, answer: str) -> None:
+        with open(f"{self.path}.entries.jsonl", "a", encoding="utf-8") as f:
+            f.write(json.dumps({"slot": slot, "scope": scope, "answer": answer}) + "\n")
+
+    def _load(self) -> None:
+        """Reopen a persisted cache, replaying the entry log onto the memory-mapped vectors."""
+        with open(f"{self.path}.json") as f:
+            meta = json.load(f)
+        if meta["capacity"] != self.capacity:
+            logger.warning("Semantic cache capacity changed, starting with an empty cache")
+            for suffix in (".f32", ".json", ".entries.jsonl"):
+                if os.path.exists(f"{self.path}{suffix}"):
+                    os.remove(f"{self.path}{suffix}")
+            return
+        self.dim = meta["dim"]
+        self._vectors = np.memmap(f"{self.path}.f32", dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+        entries = {}
+        lines = 0
+        with open(f"{self.path}.entries.jsonl", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                entries[entry["slot"]] = entry
+                lines += 1
+        now = time.time()
+        for slot, entry in entries.items():
+            self._scopes[slot] = entry["scope"]
+            self._answers[slot] = entry["answer"]
+            self._last_used[slot] = now
+        self._size = max(entries) + 1 if entries else 0
+        if lines > 2 * len(entries):
+            with open(f"{self.path}.entries.jsonl", "w", encoding="utf-8") as f:
+                for entry in entries.values():
+                    f.write(json.dumps(entry) + "\n")
+        logger.info(f"Loaded {len(entries)} semantic cache entries from {self.path}")
+
+
+semantic_cache = SemanticCache() if config.SEMANTIC_CACHE_ENABLED else None
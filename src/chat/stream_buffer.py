@@ -0,0 +1,304 @@
+"""
+Resumable streams.
+
+Each generation runs in a background thread that reads from Ollama and appends
+text chunks to a bounded, per-stream buffer. Consumers (the Gradio handler or the
+SSE endpoint) read the buffer from an offset, so a client that drops mid-answer
+can reattach and continue while the upstream generation keeps running. The
+producer holds a governor stream slot for as long as it talks to Ollama and is
+cancelled once no reader has been attached for STREAM_GRACE_SECONDS. Finished
+streams are kept for STREAM_GRACE_SECONDS as well.
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from typing import Callable, Dict, Generator, Iterator, List, Optional, Tuple
+
+from src.chat.governor import governor
+from src.chat.thinking_budget import ThinkingBudget, thinking_opened
+from src.clients.ollama import OllamaClient
+from src.config import config
+from src.utils.logger import logger
+from src.utils.metrics import metrics
+from src.utils.profiling import maybe_profile_producer
+from src.utils.tracing import NULL_TRACE
+
+
+class StreamExpiredError(Exception):
+    """Raised when a requested offset has already been dropped from the buffer."""
+
+
+class StreamBuffer:
+    """Text chunks emitted so far by one generation, bounded to STREAM_BUFFER_MAX_BYTES."""
+
+    def __init__(self, key: str, max_bytes: int = config.STREAM_BUFFER_MAX_BYTES):
+        self.stream_id = uuid.uuid4().hex
+        self.key = key
+        self.max_bytes = max_bytes
+        self.chunks: List[str] = []
+        self.base_offset = 0
+        self.bytes = 0
+        self.done = False
+        self.delivered = False
+        self.error: Optional[BaseException] = None
+        self.final: dict = {}
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.readers = 0
+        self.detached_at = self.created_at
+        self._cond = threading.Condition()
+
+    @property
+    def next_offset(self) -> int:
+        return self.base_offset + len(self.chunks)
+
+    @property
+    def truncated(self) -> bool:
+        """Whether the answer was cut off, by the stream deadline or by num_predict."""
+        return bool(self.final.get("truncated")) or self.final.get("done_reason") == "length"
+
+    def append(self, chunk: str) -> None:
+        with self._cond:
+            self.chunks.append(chunk)
+            self.bytes += len(chunk)
+            while self.bytes > self.max_bytes and len(self.chunks) > 1:
+                self.bytes -= len(self.chunks.pop(0))
+                self.base_offset += 1
+            self._cond.notify_all()
+
+    def abandoned(self) -> bool:
+        """Whether no reader has been attached for longer than STREAM_GRACE_SECONDS."""
+        with self._cond:
+            return self.readers == 0 and time.time() - self.detached_at > config.STREAM_GRACE_SECONDS
+
+    def finish(self, final: Optional[dict] = None, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self.final = final or {}
+            self.error = error
+            self.done = True
+            self.finished_at = time.time()
+            self._cond.notify_all()
+
+    def read(self, offset: int = 0, poll: float = 1.0) -> Generator[Tuple[int, str], None, None]:
+        """Yield (offset, chunk) pairs from an offset until the generation finishes."""
+        with self._cond:
+            self.readers += 1
+        try:
+            while True:
+                with self._cond:
+                    if offset < self.base_offset:
+                        raise StreamExpiredError(f"Offset {offset} of stream {self.stream_id} is no longer buffered")
+                    while offset >= self.next_offset and not self.done:
+                        self._cond.wait(poll)
+                    pending = self.chunks[offset - self.base_offset:]
+                    finished = self.done
+                for chunk in pending:
+                    yield offset, chunk
+                    offset += 1
+                if finished and offset >= self.next_offset:
+                    break
+            if self.error is not None:
+                raise self.error
+            self.delivered = True
+        finally:
+            with self._cond:
+                self.readers -= 1
+                self.detached_at = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "stream_id": self.stream_id,
+            "done": self.done,
+            "next_offset": self.next_offset,
+            "base_offset": self.base_offset,
+            "buffered_bytes": self.bytes,
+        }
+
+
+class StreamRegistry:
+    """Running and recently finished streams, by stream ID and by request key."""
+
+    def __init__(self):
+        self._streams: Dict[str, StreamBuffer] = {}
+        self._by_key: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def start(
+        self, key: str, producer: Callable[[], Iterator[str]], session_id: Optional[str] = None
+    ) -> StreamBuffer:
+        """
+        Run a producer in a background thread, buffering the chunks it yields.
+
+        Raises ServerBusyError when all MAX_CONCURRENT_STREAMS slots are taken;
+        otherwise the slot is held until the producer finishes or is cancelled.
+        """
+        slot = ExitStack()
+        slot.enter_context(governor.stream_slot(session_id))
+        buffer = StreamBuffer(key)
+        with self._lock:
+            self._cleanup()
+            self._streams[buffer.stream_id] = buffer
+            self._by_key[key] = buffer.stream_id
+        thread = threading.Thread(
+            target=self._pump, args=(buffer, maybe_profile_producer(producer), slot), name=f"stream-{buffer.stream_id[:8]}", daemon=True
+        )
+        thread.start()
+        return buffer
+
+    def get(self, stream_id: str) -> Optional[StreamBuffer]:
+        with self._lock:
+            self._cleanup()
+            return self._streams.get(stream_id)
+
+    def resume(self, key: str) -> Optional[StreamBuffer]:
+        """An identical generation whose answer never reached a client, if one is still complete."""
+        with self._lock:
+            self._cleanup()
+            buffer = self._streams.get(self._by_key.get(key, ""))
+        if buffer is None or buffer.delivered or buffer.error is not None or buffer.base_offset:
+            return None
+        if buffer.done and (buffer.truncated or buffer.final.get("cancelled")):
+            # A cut-off answer would replay as if it were complete; generate a new one instead.
+            return None
+        metrics.increment("streams.resumed")
+        return buffer
+
+    def _pump(self, buffer: StreamBuffer, producer: Callable[[], Iterator[str]], slot: ExitStack) -> None:
+        chunks = producer()
+        try:
+            while True:
+                if buffer.abandoned():
+                    # Closing the generator closes the upstream response, which stops Ollama.
+                    chunks.close()
+                    metrics.increment("streams.cancelled")
+                    logger.info(f"Cancelled stream {buffer.stream_id}: no reader attached")
+                    buffer.finish(final={"truncated": True, "cancelled": True})
+                    break
+                try:
+                    buffer.append(next(chunks))
+                except StopIteration as stop:
+                    buffer.finish(final=stop.value)
+                    break
+        except Exception as e:
+            logger.error(f"Stream {buffer.stream_id} failed: {str(e)}")
+            buffer.finish(error=e)
+        finally:
+            slot.close()
+
+    def _cleanup(self) -> None:
+        now = time.time()
+        expired = [
+            stream_id for stream_id, buffer in self._streams.items()
+            if buffer.done and now - buffer.finished_at > config.STREAM_GRACE_SECONDS
+        ]
+        for stream_id in expired:
+            buffer = self._streams.pop(stream_id)
+            if self._by_key.get(buffer.key) == stream_id:
+                del self._by_key[buffer.key]
+
+
+def stream_key(
+    model: str, prompt: str, messages: Optional[List[dict]], options: Optional[dict], session_id: Optional[str] = None
+) -> str:
+    """Identify a session's generation request so an identical re-submission can reattach to it."""
+    payload = json.dumps([session_id, model, prompt, messages, options], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def ollama_chunks(
+    client: OllamaClient,
+    model: str,
+    prompt: str = "",
+    messages: Optional[List[dict]] = None,
+    options: Optional[dict] = None,
+    deadline: Optional[float] = None,
+    trace=NULL_TRACE,
+    budget: Optional[ThinkingBudget] = None
+) -> Generator[str, None, dict]:
+    """
+    Yield text chunks from Ollama; returns the final chunk's stats, flagged if cut off.
+
+    With a thinking budget, a reasoning phase that runs over it is stopped: the
+    partial thinking is closed with THINK_END_TAG and generation restarts through
+    /api/chat with it as the start of the assistant turn, so the model answers.
+    """
+    with trace.span("stream_response", prompt_chars=len(prompt)):
+        if messages is not None:
+            response = client.stream_chat(model, messages, options)
+        else:
+            response = client.stream_response(model, prompt, options)
+
+    text = ""
+    thinking_since: Optional[float] = None
+    thinking_checked = False
+    thinking_done = False
+    stats = {"thinking_tokens": 0}
+    end_tag = config.THINK_END_TAG
+    try:
+        while True:
+            over_budget = False
+            for data in _stream_data(response):
+                if deadline is not None and time.time() > deadline:
+                    logger.warning(f"Stopping generation for {model}: stream time limit reached")
+                    trace.event("deadline_reached")
+                    return {**stats, "truncated": True}
+                chunk = data.get("response") or data.get("message", {}).get("content", "")
+                if chunk:
+                    text += chunk
+                    yield chunk
+                    if not thinking_checked:
+                        opened = thinking_opened(text)
+                        thinking_checked = opened is not None
+                        if opened:
+                            thinking_since = time.time()
+                            thinking_done = end_tag in text
+                    elif thinking_since is not None and not thinking_done:
+                        thinking_done = end_tag in text[-(len(chunk) + len(end_tag)):]
+                        if not thinking_done:
+                            stats["thinking_tokens"] += 1
+                            stats["thinking_seconds"] = round(time.time() - thinking_since, 3)
+                            over_budget = budget is not None and budget.exhausted(
+                                stats["thinking_tokens"], time.time() - thinking_since
+                            )
+                            if over_budget:
+                                break
+                if data.get("done"):
+                    return {**data, **stats}
+            if not over_budget:
+                return stats
+
+            response.close()
+            logger.info(f"Thinking budget of {model} exhausted after {stats['thinking_tokens']} tokens")
+            trace.event("thinking_budget_exhausted", tokens=stats["thinking_tokens"])
+            stats["thinking_budget_exhausted"] = True
+            thinking_done = True
+            closing = f"\n{end_tag}\n\n"
+            text += closing
+            yield closing
+            continuation = list(messages) if messages is not None else [{"role": "user", "content": prompt}]
+            continuation.append({"role": "assistant", "content": text.strip() + "\n\n"})
+            with trace.span("thinking_restart"):
+                response = client.stream_chat(model, continuation, options)
+    finally:
+        response.close()
+
+
+def _stream_data(response) -> Generator[dict, None, None]:
+    """Parsed NDJSON objects of a streamed Ollama response."""
+    for line in response.iter_lines():
+        if not line:
+            continue
+        try:
+            data = json.loads(line.decode("utf-8"))
+        except json.JSONDecodeError as e:
+            logger.error(f"Error processing response: {str(e)}")
+            continue
+        if "error" in data:
+            raise RuntimeError(data["error"])
+        yield data
+
+
+stream_registry = StreamRegistry()
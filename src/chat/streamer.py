@@ -1,63 +1,141 @@
-import json
 import time
 from typing import Generator, Optional, Union, List
 import gradio as gr
 from src.clients.ollama import OllamaClient
+from src.chat.stream_buffer import ollama_chunks, stream_key, stream_registry
+from src.chat.thinking_budget import budget_for, thinking_opened
+from src.chat.thinking_store import thinking_store, make_preview
 from src.config import config
 from src.utils.logger import logger
+from src.utils.tracing import NULL_TRACE
 
 class ChatStreamer:
     """Encapsulates the logic for streaming and processing responses from Ollama."""
     
-    def __init__(self, client: OllamaClient, selected_model: str, prompt: str):
+    def __init__(
+        self,
+        client: OllamaClient,
+        selected_model: str,
+        prompt: str,
+        trace=NULL_TRACE,
+        options: Optional[dict] = None,
+        deadline: Optional[float] = None,
+        messages: Optional[List[dict]] = None,
+        session_id: Optional[str] = None
+    ):
         self.client = client
         self.selected_model = selected_model
         self.prompt = prompt
+        self.messages = messages
+        self.session_id = session_id
+        self.trace = trace
+        self.options = options
+        self.deadline = deadline
+        self.stream_id: Optional[str] = None
+        self.thinking_budget = budget_for(selected_model)
+        self.time_to_first_chunk: Optional[float] = None
+        self.time_to_answer: Optional[float] = None
+        self.thinking_tokens = 0
+        self.thinking_seconds: Optional[float] = None
+        self.budget_exhausted = False
+        self.answer_text = ""
+        self.truncated = False
         self.accumulated_text = ""
         self.thinking_message: Optional[gr.ChatMessage] = None
         self.thinking_start_time: Optional[float] = None
+        self._thinking: Optional[bool] = None
 
     def stream(self) -> Generator[Union[gr.ChatMessage, List[gr.ChatMessage]], None, None]:
         """Streams and yields chat messages as they are processed."""
-        response = self.client.stream_response(self.selected_model, self.prompt)
-
-        for line in response.iter_lines():
-            if not line:
-                continue
+        stream_started = time.perf_counter()
+        key = stream_key(self.selected_model, self.prompt, self.messages, self.options, self.session_id)
+        buffer = stream_registry.resume(key)
+        if buffer is not None:
+            logger.info(f"Resuming stream {buffer.stream_id} for {self.selected_model}")
+            self.trace.event("stream_resumed", stream_id=buffer.stream_id)
+        else:
+            buffer = stream_registry.start(key, lambda: ollama_chunks(
+                self.client,
+                self.selected_model,
+                self.prompt,
+                messages=self.messages,
+                options=self.options,
+                deadline=self.deadline,
+                trace=self.trace,
+                budget=self.thinking_budget
+            ), session_id=self.session_id)
+        self.stream_id = buffer.stream_id
 
-            try:
-                data = json.loads(line.decode("utf-8"))
-                chunk = data.get("response", "")
-                self.accumulated_text += chunk
+        for _, chunk in buffer.read():
+            if self.time_to_first_chunk is None:
+                self.time_to_first_chunk = time.perf_counter() - stream_started
+                self.trace.event("first_chunk")
+            self.accumulated_text += chunk
 
-                messages = self._process_accumulated_text()
-                for message in messages:
-                    yield message
+            started = time.perf_counter()
+            messages = self._process_accumulated_text()
+            self.trace.accumulate("ui_update", time.perf_counter() - started)
+            if self.time_to_answer is None and self._answer_started():
+                self.time_to_answer = time.perf_counter() - stream_started
+            for message in messages:
+                yield message
 
-            except (json.JSONDecodeError, KeyError) as e:
-                logger.error(f"Error processing response: {str(e)}")
+        self.truncated = buffer.truncated
+        self.budget_exhausted = bool(buffer.final.get("thinking_budget_exhausted"))
+        # The producer's count is the one the budget was enforced against
+        self.thinking_tokens = buffer.final.get("thinking_tokens", self.thinking_tokens)
+        if buffer.final.get("done"):
+            self._record_ollama_timings(buffer.final)
 
-        for message in self._finalize_messages():
+        with self.trace.span("final_flush"):
+            final_messages = self._finalize_messages()
+        for message in final_messages:
             yield message
 
+    def _record_ollama_timings(self, data: dict) -> None:
+        """Attach Ollama's own load/prompt-eval/eval timings from the final chunk to the trace."""
+        self.trace.set(**{
+            f"ollama_{key}_ms": round(data[key] / 1_000_000, 3)
+            for key in ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration")
+            if key in data
+        })
+        self.trace.set(
+            prompt_eval_count=data.get("prompt_eval_count"),
+            eval_count=data.get("eval_count"),
+        )
+
     def _process_accumulated_text(self) -> List[Union[gr.ChatMessage, List[gr.ChatMessage]]]:
         """Process the accumulated text and return messages based on thinking markers."""
         messages: List[Union[gr.ChatMessage, List[gr.ChatMessage]]] = []
 
-        if (self.accumulated_text.startswith(config.THINK_START_TAG) and 
-            config.THINK_END_TAG not in self.accumulated_text):
+        if self._thinking is None:
+            # Detected the same way as in ollama_chunks, which enforces the budget
+            self._thinking = thinking_opened(self.accumulated_text)
+
+        if self._thinking and config.THINK_END_TAG not in self.accumulated_text:
             if self.thinking_message is None:
+                self.trace.event("thinking_start")
                 self.thinking_start_time = time.time()
                 self.thinking_message = gr.ChatMessage(
                     content="",
                     metadata={"title": "Thinking...", "id": 0, "status": "pending"},
                 )
+            else:
+                self.thinking_tokens += 1
+            if self.thinking_budget is not None:
+                self.thinking_message.metadata["log"] = self.thinking_budget.describe(
+                    self.thinking_tokens, time.time() - self.thinking_start_time
+                )
             thinking_content = self.accumulated_text.split(config.THINK_START_TAG, 1)[1].strip()
             self.thinking_message.content = thinking_content
             messages.append(self.thinking_message)
 
         elif config.THINK_END_TAG in self.accumulated_text:
             if self.thinking_message is not None:
+                if self.thinking_message.metadata["status"] == "pending":
+                    self.trace.event("thinking_end")
+                    self.thinking_seconds = time.time() - self.thinking_start_time
+                    self._update_budget_log()
                 self.thinking_message.metadata["status"] = "done"
                 if self.thinking_start_time:
                     self.thinking_message.metadata["time"] = time.time() - self.thinking_start_time
@@ -74,7 +152,40 @@ class ChatStreamer:
             self.thinking_message.metadata["status"] = "done"
             if self.thinking_start_time:
                 self.thinking_message.metadata["time"] = time.time() - self.thinking_start_time
-            assistant_text = self.accumulated_text.split(config.THINK_END_TAG, 1)[1].strip()
-            return [[self.thinking_message, gr.ChatMessage(content=assistant_text, role="assistant")]]
+            self.answer_text = self.accumulated_text.split(config.THINK_END_TAG, 1)[1].strip()
+            self._update_budget_log()
+            self._archive_thinking()
+            return [[self.thinking_message, gr.ChatMessage(content=self.answer_text, role="assistant")]]
         else:
-            return [gr.ChatMessage(content=self.accumulated_text.strip(), role="assistant")]
\ No newline at end of file
+            self.answer_text = self.accumulated_text.strip()
+            return [gr.ChatMessage(content=self.answer_text, role="assistant")]
+
+    def _answer_started(self) -> bool:
+        """Whether any answer text (as opposed to thinking) has been streamed yet."""
+        if self.thinking_message is None:
+            return bool(self.accumulated_text.strip())
+        answer = self.accumulated_text.split(config.THINK_END_TAG, 1)
+        return len(answer) > 1 and bool(answer[1].strip())
+
+    def _update_budget_log(self) -> None:
+        """Show how much of the thinking budget the finished reasoning used."""
+        if self.thinking_budget is None or self.thinking_seconds is None:
+            return
+        log = self.thinking_budget.describe(self.thinking_tokens, self.thinking_seconds)
+        if self.budget_exhausted:
+            log += " (budget reached, answering early)"
+        self.thinking_message.metadata["log"] = log
+
+    def _archive_thinking(self) -> None:
+        """Move the finished thinking text to compressed storage, leaving a preview in the history."""
+        thinking_text = (
+            self.accumulated_text.split(config.THINK_START_TAG, 1)[1]
+            .split(config.THINK_END_TAG, 1)[0]
+            .strip()
+        )
+        self.thinking_message.content = thinking_text
+        if len(thinking_text) <= config.THINKING_PREVIEW_CHARS:
+            return
+        self.thinking_message.metadata["id"] = thinking_store.put(thinking_text, self.session_id)
+        self.thinking_message.content = make_preview(thinking_text)
+        self.accumulated_text = ""
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Per-model limits on the reasoning (<think>) phase of thinking models.
+
+Budgets come from THINKING_BUDGETS, a JSON object mapping a model name (with or
+without its tag) or "*" to {"tokens": N, "seconds": S}, falling back to
+THINKING_BUDGET_TOKENS / THINKING_BUDGET_SECONDS. Zero means no limit.
+"""
+import json
+from typing import Dict, Optional
+
+from src.config import config
+from src.utils.logger import logger
+
+
+class ThinkingBudget:
+    """How many tokens or seconds a model may spend thinking before it is made to answer."""
+
+    def __init__(self, tokens: int = 0, seconds: float = 0.0):
+        self.tokens = int(tokens or 0)
+        self.seconds = float(seconds or 0.0)
+
+    def __bool__(self) -> bool:
+        return self.tokens > 0 or self.seconds > 0
+
+    def exhausted(self, tokens: int, seconds: float) -> bool:
+        return (self.tokens > 0 and tokens >= self.tokens) or (self.seconds > 0 and seconds >= self.seconds)
+
+    def describe(self, tokens: int, seconds: float) -> str:
+        """Budget use for display, e.g. "312/1024 tokens, 8.4/20s"."""
+        parts = [f"{tokens}/{self.tokens} tokens" if self.tokens else f"{tokens} tokens"]
+        if self.seconds:
+            parts.append(f"{seconds:.1f}/{self.seconds:g}s")
+        return ", ".join(parts)
+
+    def to_dict(self) -> dict:
+        return {"tokens": self.tokens, "seconds": self.seconds}
+
+
+def _load_budgets(raw: str) -> Dict[str, ThinkingBudget]:
+    if not raw:
+        return {}
+    try:
+        return {model: ThinkingBudget(**limits) for model, limits in json.loads(raw).items()}
+    except (TypeError, ValueError, AttributeError) as e:
+        logger.error(f"Ignoring invalid THINKING_BUDGETS: {str(e)}")
+        return {}
+
+
+_budgets = _load_budgets(config.THINKING_BUDGETS)
+_default_budget = ThinkingBudget(config.THINKING_BUDGET_TOKENS, config.THINKING_BUDGET_SECONDS)
+
+
+def thinking_opened(text: str) -> Optional[bool]:
+    """Whether a response opens with THINK_START_TAG; None while its start is still undecided."""
+    head = text.lstrip()
+    if head.startswith(config.THINK_START_TAG):
+        return True
+    if not head or config.THINK_START_TAG.startswith(head):
+        return None
+    return False
+
+
+def budget_for(model: str) -> Optional[ThinkingBudget]:
+    """The thinking budget configured for a model, or None if it may think without limit."""
+    for key in (model, model.split(":", 1)[0], "*"):
+        if key in _budgets:
+            budget = _budgets[key]
+            break
+    else:
+        budget = _default_budget
+    return budget if budget else None
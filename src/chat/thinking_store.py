@@ -0,0 +1,153 @@
+"""
+Compressed, memory-bounded storage for the reasoning traces of finished turns.
+
+Traces are tracked per session and discarded when the governor evicts the
+session. Spilled files older than SESSION_IDLE_SECONDS, such as those left by a
+previous run, are removed at startup.
+"""
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from src.chat.governor import governor
+from src.config import config
+from src.utils.logger import logger
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+
+class ThinkingStore:
+    """Keeps full thinking text compressed in memory, spilling to disk past a byte cap."""
+
+    def __init__(
+        self,
+        max_bytes: int = config.THINKING_STORE_MAX_BYTES,
+        spill_dir: Optional[str] = config.THINKING_STORE_DIR,
+    ):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._keys_by_session: Dict[str, List[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if zstandard is not None:
+            self._codec = "zstd"
+            self._compressor = zstandard.ZstdCompressor(level=3)
+            self._decompressor = zstandard.ZstdDecompressor()
+        else:
+            self._codec = "zlib"
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._remove_stale_spills()
+
+    @property
+    def memory_bytes(self) -> int:
+        """Compressed bytes currently held in process memory."""
+        return self._bytes
+
+    def put(self, text: str, session_id: Optional[str] = None) -> str:
+        """Compress and store thinking text, returning the key used to load it back."""
+        key = f"think-{uuid.uuid4().hex}"
+        blob = self._compress(text.encode("utf-8"))
+        with self._lock:
+            if session_id is not None:
+                self._keys_by_session.setdefault(session_id, []).append(key)
+            self._entries[key] = blob
+            self._bytes += len(blob)
+            self._evict()
+        return key
+
+    def get(self, key: str) -> Optional[str]:
+        """Load the full thinking text for a key, or None if it is no longer available."""
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+        if blob is None:
+            blob = self._read_spilled(key)
+        if blob is None:
+            return None
+        return self._decompress(blob).decode("utf-8")
+
+    def discard(self, key: str) -> None:
+        """Forget a stored trace, both in memory and on disk."""
+        with self._lock:
+            blob = self._entries.pop(key, None)
+            if blob is not None:
+                self._bytes -= len(blob)
+        path = self._spill_path(key)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def forget(self, session_id: str) -> None:
+        """Discard every trace stored for a session."""
+        with self._lock:
+            keys = self._keys_by_session.pop(session_id, [])
+        for key in keys:
+            self.discard(key)
+
+    def _remove_stale_spills(self) -> None:
+        cutoff = time.time() - config.SESSION_IDLE_SECONDS
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            try:
+                if name.startswith("think-") and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def _evict(self) -> None:
+        """Move least recently used traces out of memory until under the cap."""
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key, blob = self._entries.popitem(last=False)
+            self._bytes -= len(blob)
+            path = self._spill_path(key)
+            if path:
+                with open(path, "wb") as f:
+                    f.write(blob)
+            else:
+                logger.debug(f"Dropped thinking trace {key} to stay under memory cap")
+
+    def _spill_path(self, key: str) -> Optional[str]:
+        if not self.spill_dir:
+            return None
+        return os.path.join(self.spill_dir, f"{key}.{self._codec}")
+
+    def _read_spilled(self, key: str) -> Optional[bytes]:
+        path = self._spill_path(key)
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _compress(self, data: bytes) -> bytes:
+        if self._codec == "zstd":
+            return self._compressor.compress(data)
+        return zlib.compress(data, 6)
+
+    def _decompress(self, blob: bytes) -> bytes:
+        if self._codec == "zstd":
+            return self._decompressor.decompress(blob)
+        return zlib.decompress(blob)
+
+
+PREVIEW_HINT = "*Click to load the full reasoning.*"
+UNAVAILABLE_NOTE = "*The full reasoning is no longer available.*"
+
+
+def make_preview(text: str, limit: int = config.THINKING_PREVIEW_CHARS) -> str:
+    """Shorten thinking text to a preview kept in the live chat history."""
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit].rstrip()}…\n\n{PREVIEW_HINT}"
+
+
+thinking_store = ThinkingStore()
+governor.on_evict(thinking_store.forget)
@@ -1,5 +1,10 @@
+import os
 from typing import Union, List, Optional
 import gradio as gr
+from src.chat.images import file_path_from_content, image_cache, is_image_path
+from src.config import config
+from src.utils.logger import logger
+from src.utils.tracing import span
 
 def convert_to_chat_message(
     msg: Union[gr.ChatMessage, dict, list]
@@ -17,29 +22,104 @@ def convert_to_chat_message(
         return [convert_to_chat_message(m) for m in msg]
     raise ValueError(f"Unsupported message type: {type(msg)}")
 
-def prepare_prompt(
-    history: Optional[List[Union[gr.ChatMessage, dict, list]]], 
-    user_message: str, 
+def flatten_history(
+    history: Optional[List[Union[gr.ChatMessage, dict, list]]],
     custom_instructions: str = ""
-) -> str:
-    """Prepare a prompt from chat history and the new user message."""
+) -> List[gr.ChatMessage]:
+    """Convert the history to a flat list of gr.ChatMessage, led by any custom instructions."""
     history = history or []
     if custom_instructions:
         history.insert(0, gr.ChatMessage(content=custom_instructions, role="system"))
     
     chat_history: List[gr.ChatMessage] = []
-    for msg in history:
-        converted = convert_to_chat_message(msg)
-        if isinstance(converted, list):
-            chat_history.extend(converted)
-        else:
-            chat_history.append(converted)
-    
+    with span("convert_to_chat_message", messages=len(history)):
+        for msg in history:
+            converted = convert_to_chat_message(msg)
+            if isinstance(converted, list):
+                chat_history.extend(converted)
+            else:
+                chat_history.append(converted)
+    return chat_history
+
+def approximate_token_count(text: str) -> int:
+    """Roughly approximate the number of tokens in a text as len(text) / 3.5."""
+    return max(1, int(len(text) // 3.5))
+
+def prepare_prompt(
+    history: Optional[List[Union[gr.ChatMessage, dict, list]]], 
+    user_message: str, 
+    custom_instructions: str = ""
+) -> str:
+    """Prepare a prompt from chat history and the new user message."""
+    chat_history = flatten_history(history, custom_instructions)
     chat_history.append(gr.ChatMessage(content=user_message, role="user"))
     
     prompt = "\n".join(
         f"{msg.role}: {msg.content}"
         for msg in chat_history
-        if not msg.metadata
+        if not msg.metadata and isinstance(msg.content, str)
     )
     return prompt
+
+def history_has_images(history: Optional[List[Union[gr.ChatMessage, dict, list]]]) -> bool:
+    """Check whether any message in the history is an image upload."""
+    for msg in history or []:
+        messages = msg if isinstance(msg, list) else [msg]
+        for m in messages:
+            content = m.get("content") if isinstance(m, dict) else getattr(m, "content", None)
+            if not isinstance(content, str) and is_image_path(file_path_from_content(content)):
+                return True
+    return False
+
+def prepare_chat_messages(
+    history: Optional[List[Union[gr.ChatMessage, dict, list]]],
+    user_message: str,
+    custom_instructions: str = "",
+    image_paths: Optional[List[str]] = None,
+    max_image_side: int = config.VISION_MAX_IMAGE_SIDE
+) -> List[dict]:
+    """
+    Prepare /api/chat messages, attaching images as base64 payloads.
+
+    Payloads come from the shared image cache, so an image resent on every turn
+    is only downscaled and encoded once, and an image that appears several times
+    in the conversation is only sent once. Images that can't be decoded are
+    skipped with a warning rather than failing the turn.
+    """
+    chat_history = flatten_history(history, custom_instructions)
+    sent_images = set()
+
+    def encode_images(paths: List[str]) -> List[str]:
+        images = []
+        for path in paths:
+            if not is_image_path(path):
+                logger.debug(f"Skipping non-image attachment {path}")
+                continue
+            try:
+                encoded = image_cache.encode(path, max_image_side)
+            except Exception as e:
+                logger.warning(f"Skipping image {os.path.basename(path)} that could not be decoded: {str(e)}")
+                continue
+            if encoded not in sent_images:
+                sent_images.add(encoded)
+                images.append(encoded)
+        return images
+
+    messages: List[dict] = []
+    with span("encode_images"):
+        for msg in chat_history:
+            if msg.metadata:
+                continue
+            if isinstance(msg.content, str):
+                messages.append({"role": msg.role, "content": msg.content})
+                continue
+            images = encode_images([file_path_from_content(msg.content)])
+            if images:
+                messages.append({"role": msg.role, "content": "", "images": images})
+
+        user_turn = {"role": "user", "content": user_message}
+        images = encode_images(image_paths or [])
+        if images:
+            user_turn["images"] = images
+        messages.append(user_turn)
+    return messages
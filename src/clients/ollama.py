@@ -1,6 +1,8 @@
 import requests
-from typing import List
+from typing import List, Optional
 from src.config import config
+from src.tuning.profiles import profile_store
+from src.utils.cache import shared_cache
 from src.utils.logger import logger
 
 class OllamaClient:
@@ -11,25 +13,97 @@ class OllamaClient:
         self.session = requests.Session()
         self.timeout = config.TIMEOUT
 
-    def fetch_models(self) -> List[str]:
-        """Retrieve available models from Ollama."""
+    def model_options(self, model: str, options: Optional[dict] = None) -> dict:
+        """Tuned options for the model, overridden by any per-request options."""
+        merged = profile_store.options_for(model)
+        merged.update(options or {})
+        return merged
+
+    def fetch_models(self, use_cache: bool = True) -> List[str]:
+        """Retrieve available models from Ollama, cached across workers."""
+        cache_key = f"models:{self.base_url}"
+        models = shared_cache.get(cache_key) if use_cache else None
+        if models is not None:
+            return models
         try:
             response = self.session.get(
                 f"{self.base_url}/api/tags",
                 timeout=self.timeout
             )
             response.raise_for_status()
-            return [model["name"] for model in response.json().get("models", [])]
+            models = [model["name"] for model in response.json().get("models", [])]
+            shared_cache.set(cache_key, models, ttl=config.MODEL_CACHE_TTL)
+            return models
         except Exception as e:
             logger.error(f"Failed to fetch models: {str(e)}")
             return []
 
-    def stream_response(self, model: str, prompt: str) -> requests.Response:
+    def get_model_info(self, model_name: str) -> dict:
+        """Get detailed information about a specific model, cached across workers."""
+        cache_key = f"model_info:{self.base_url}:{model_name}"
+        info = shared_cache.get(cache_key)
+        if info is not None:
+            return info
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/show",
+                json={"name": model_name},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            info = response.json()
+            shared_cache.set(cache_key, info, ttl=config.MODEL_CACHE_TTL)
+            return info
+        except Exception as e:
+            logger.debug(f"Failed to fetch model info for {model_name}: {str(e)}")
+            return {}
+
+    def stream_response(self, model: str, prompt: str, options: Optional[dict] = None) -> requests.Response:
         """Stream response from the Ollama generate API."""
+        payload = {"model": model, "prompt": prompt, "stream": True}
+        options = self.model_options(model, options)
+        if options:
+            payload["options"] = options
         try:
             response = self.session.post(
                 f"{self.base_url}/api/generate",
-                json={"model": model, "prompt": prompt, "stream": True},
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                stream=True,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response
+        except Exception as e:
+            logger.error(f"API request failed: {str(e)}")
+            raise
+
+    def generate(
+        self, model: str, prompt: str, options: Optional[dict] = None, timeout: Optional[int] = None
+    ) -> str:
+        """Generate a complete, non-streamed response from the Ollama generate API."""
+        payload = {"model": model, "prompt": prompt, "stream": False}
+        options = self.model_options(model, options)
+        if options:
+            payload["options"] = options
+        response = self.session.post(
+            f"{self.base_url}/api/generate",
+            json=payload,
+            timeout=timeout or self.timeout
+        )
+        response.raise_for_status()
+        return response.json().get("response", "")
+
+    def stream_chat(self, model: str, messages: List[dict], options: Optional[dict] = None) -> requests.Response:
+        """Stream response from the Ollama chat API, used for turns that carry images."""
+        payload = {"model": model, "messages": messages, "stream": True}
+        options = self.model_options(model, options)
+        if options:
+            payload["options"] = options
+        try:
+            response = self.session.post(
+                f"{self.base_url}/api/chat",
+                json=payload,
                 headers={"Content-Type": "application/json"},
                 stream=True,
                 timeout=self.timeout
@@ -38,4 +112,50 @@ class OllamaClient:
             return response
         except Exception as e:
             logger.error(f"API request failed: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def embed(self, model: str, text: str) -> List[float]:
+        """Embed a piece of text with the Ollama embed API."""
+        response = self.session.post(
+            f"{self.base_url}/api/embed",
+            json={"model": model, "input": text},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["embeddings"][0]
+
+    def embed_batch(self, model: str, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        """Embed several texts in one request."""
+        response = self.session.post(
+            f"{self.base_url}/api/embed",
+            json={"model": model, "input": texts},
+            timeout=timeout or self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    def prefill(self, model: str, prompt: str, options: Optional[dict] = None) -> requests.Response:
+        """
+        Send a prompt for evaluation only, warming the server's KV cache.
+
+        Ollama treats num_predict 0 as "no limit", so a single token is requested.
+        The response is streamed so a superseded prefill can be cancelled by closing it.
+        Options must match the real request's, or Ollama reloads the model.
+        """
+        options = self.model_options(model, options)
+        options["num_predict"] = 1
+        response = self.session.post(
+            f"{self.base_url}/api/generate",
+            json={
+                "model": model,
+                "prompt": prompt,
+                "stream": True,
+                "options": options,
+                "keep_alive": config.PREFILL_KEEP_ALIVE,
+            },
+            headers={"Content-Type": "application/json"},
+            stream=True,
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response
@@ -8,7 +8,80 @@ class Config:
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     LOG_LEVEL: str = "info"
+
+    # Deployment: WORKERS > 1 starts one process per port (PORT, PORT + 1, ...)
+    WORKERS: int = int(os.getenv("WORKERS", 1))
+    STATE_BACKEND: str = os.getenv("STATE_BACKEND", "sqlite" if WORKERS > 1 else "memory")
+    STATE_DB_PATH: str = os.getenv("STATE_DB_PATH", "data/state.sqlite3")
+    MODEL_CACHE_TTL: int = int(os.getenv("MODEL_CACHE_TTL", 60))
     
+    # Tracing: fraction of chat requests traced, and optional OTLP/HTTP collector
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", 0.0))
+    OTEL_EXPORTER_OTLP_ENDPOINT: Optional[str] = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT") or None
+
+    # Speculative prefill: warm Ollama's KV cache while the user is typing
+    PREFILL_ENABLED: bool = os.getenv("PREFILL_ENABLED", "false").lower() == "true"
+    PREFILL_DEBOUNCE_SECONDS: float = float(os.getenv("PREFILL_DEBOUNCE_SECONDS", 0.6))
+    PREFILL_MIN_INTERVAL_SECONDS: float = float(os.getenv("PREFILL_MIN_INTERVAL_SECONDS", 3.0))
+    PREFILL_MAX_AGE_SECONDS: float = float(os.getenv("PREFILL_MAX_AGE_SECONDS", 300.0))
+    PREFILL_KEEP_ALIVE: str = os.getenv("PREFILL_KEEP_ALIVE", "5m")
+
+    # Resource governor
+    MAX_CONCURRENT_STREAMS: int = int(os.getenv("MAX_CONCURRENT_STREAMS", 8))
+    QUEUE_MAX_SIZE: int = int(os.getenv("QUEUE_MAX_SIZE", 64))
+    MAX_HISTORY_BYTES: int = int(os.getenv("MAX_HISTORY_BYTES", 256 * 1024))
+    MAX_SESSIONS: int = int(os.getenv("MAX_SESSIONS", 500))
+    SESSION_IDLE_SECONDS: int = int(os.getenv("SESSION_IDLE_SECONDS", 1800))
+    MAX_NUM_PREDICT: int = int(os.getenv("MAX_NUM_PREDICT", 4096))
+    MAX_STREAM_SECONDS: int = int(os.getenv("MAX_STREAM_SECONDS", 600))
+
+    # Admin endpoints are disabled unless a token is configured
+    ADMIN_TOKEN: Optional[str] = os.getenv("ADMIN_TOKEN") or None
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_MAX_SECONDS: int = int(os.getenv("PROFILING_MAX_SECONDS", 120))
+
+    # Embeddings, shared by features that embed text through Ollama
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+
+    # Semantic response cache for first-turn questions
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))
+    SEMANTIC_CACHE_CAPACITY: int = int(os.getenv("SEMANTIC_CACHE_CAPACITY", 10000))
+    SEMANTIC_CACHE_PATH: Optional[str] = os.getenv("SEMANTIC_CACHE_PATH") or None
+
+    # Vision: images are downscaled to the model's input size (at most VISION_MAX_IMAGE_SIDE) and encoded once
+    VISION_MAX_IMAGE_SIDE: int = int(os.getenv("VISION_MAX_IMAGE_SIDE", 1120))
+    VISION_JPEG_QUALITY: int = int(os.getenv("VISION_JPEG_QUALITY", 85))
+    IMAGE_CACHE_MAX_BYTES: int = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+    # History compaction: summarize old turns with a small model during idle time
+    COMPACTION_ENABLED: bool = os.getenv("COMPACTION_ENABLED", "false").lower() == "true"
+    COMPACTION_MODEL: str = os.getenv("COMPACTION_MODEL", "qwen2.5:0.5b")
+    COMPACTION_TRIGGER_TOKENS: int = int(os.getenv("COMPACTION_TRIGGER_TOKENS", 3000))
+    COMPACTION_KEEP_RECENT_TOKENS: int = int(os.getenv("COMPACTION_KEEP_RECENT_TOKENS", 1000))
+    COMPACTION_IDLE_SECONDS: float = float(os.getenv("COMPACTION_IDLE_SECONDS", 5.0))
+    COMPACTION_TIMEOUT: int = int(os.getenv("COMPACTION_TIMEOUT", 120))
+
+    # Tuned per-model Ollama options, written by `python -m src.tuning`
+    TUNING_PROFILES_PATH: str = os.getenv("TUNING_PROFILES_PATH", "data/tuning_profiles.json")
+
+    # Resumable streams: chunks kept per generation and how long finished ones stay resumable
+    STREAM_BUFFER_MAX_BYTES: int = int(os.getenv("STREAM_BUFFER_MAX_BYTES", 1_048_576))
+    STREAM_GRACE_SECONDS: int = int(os.getenv("STREAM_GRACE_SECONDS", 120))
+
+    # Session documents: chunked and embedded once, top-k chunks injected per turn
+    DOCUMENTS_DIR: str = os.getenv("DOCUMENTS_DIR", "data/documents")
+    DOCUMENT_CHUNK_CHARS: int = int(os.getenv("DOCUMENT_CHUNK_CHARS", 1500))
+    DOCUMENT_CHUNK_OVERLAP: int = int(os.getenv("DOCUMENT_CHUNK_OVERLAP", 200))
+    DOCUMENT_TOP_K: int = int(os.getenv("DOCUMENT_TOP_K", 4))
+    DOCUMENT_INGEST_WORKERS: int = int(os.getenv("DOCUMENT_INGEST_WORKERS", 2))
+    DOCUMENT_EMBED_TIMEOUT: int = int(os.getenv("DOCUMENT_EMBED_TIMEOUT", 120))
+
+    # Thinking budget: cut reasoning short and make the model answer (0 = no limit)
+    THINKING_BUDGET_TOKENS: int = int(os.getenv("THINKING_BUDGET_TOKENS", 0))
+    THINKING_BUDGET_SECONDS: float = float(os.getenv("THINKING_BUDGET_SECONDS", 0))
+    THINKING_BUDGETS: str = os.getenv("THINKING_BUDGETS", "")
+
     # Gradio settings
     GRADIO_PATH: str = "/gradio"
     
@@ -16,4 +89,9 @@ class Config:
     THINK_START_TAG: str = "<think>"
     THINK_END_TAG: str = "</think>"
 
+    # Thinking storage: finished reasoning traces are compressed and kept out of the live history
+    THINKING_STORE_MAX_BYTES: int = int(os.getenv("THINKING_STORE_MAX_BYTES", 64 * 1024 * 1024))
+    THINKING_STORE_DIR: Optional[str] = os.getenv("THINKING_STORE_DIR") or None
+    THINKING_PREVIEW_CHARS: int = int(os.getenv("THINKING_PREVIEW_CHARS", 400))
+
 config = Config()
\ No newline at end of file
@@ -1,26 +1,66 @@
 """
 Main entry point for the Ollama Chat application.
 """
+import multiprocessing
+import os
 import uvicorn
-import gradio as gr
-from src.api.app import create_app
-from src.ui.interface import create_interface
 from src.config import config
 
-app = create_app()
+def create_server_app():
+    """
+    Build the FastAPI app with the Gradio interface mounted.
 
-interface = create_interface()
-gr.mount_gradio_app(app, interface, path=config.GRADIO_PATH)
+    Built on demand rather than at import time so that processes which import
+    this module as __main__ (spawned document ingest workers) don't construct
+    the app, the interface and their singletons.
+    """
+    import gradio as gr
+    from src.api.app import create_app
+    from src.ui.interface import create_interface
 
-def main():
-    """Run the application with uvicorn."""
+    app = create_app()
+    gr.mount_gradio_app(app, create_interface(), path=config.GRADIO_PATH)
+    return app
+
+def run_worker(port: int, worker_id: int = 0):
+    """Run a single uvicorn process serving the app on the given port."""
+    os.environ["WORKER_ID"] = str(worker_id)
     uvicorn.run(
-        "src.main:app",  
+        "src.main:create_server_app",
+        factory=True,
         host=config.HOST,
-        port=config.PORT,
+        port=port,
         log_level=config.LOG_LEVEL,
         reload=False  
     )
 
+def main():
+    """
+    Run the application with uvicorn.
+
+    With WORKERS > 1 every worker is a separate process on its own port so that
+    a sticky load balancer can keep each Gradio streaming session on one worker.
+    """
+    if config.WORKERS <= 1:
+        run_worker(config.PORT)
+        return
+
+    processes = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(config.PORT + worker_id, worker_id),
+            name=f"ollama-chat-worker-{worker_id}"
+        )
+        for worker_id in range(config.WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
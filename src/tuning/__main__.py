@@ -0,0 +1,3 @@
+from src.tuning.tuner import main
+
+main()
@@ -0,0 +1,63 @@
+"""
+Per-model Ollama option profiles written by the tuner and applied by OllamaClient.
+"""
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from src.config import config
+from src.utils.logger import logger
+
+
+class ProfileStore:
+    """JSON file of tuned options per model, reloaded when the file changes on disk."""
+
+    def __init__(self, path: str = config.TUNING_PROFILES_PATH):
+        self.path = path
+        self._profiles: Dict[str, dict] = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def options_for(self, model: str) -> dict:
+        """Tuned Ollama options for a model, or an empty dict if it was never tuned."""
+        self._reload_if_changed()
+        profile = self._profiles.get(model)
+        return dict(profile["options"]) if profile else {}
+
+    def all(self) -> Dict[str, dict]:
+        self._reload_if_changed()
+        return dict(self._profiles)
+
+    def save(self, model: str, profile: dict) -> None:
+        """Store the best profile for a model, keeping the other models' profiles."""
+        with self._lock:
+            self._reload_if_changed()
+            profiles = dict(self._profiles)
+            profiles[model] = profile
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(profiles, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self._profiles = profiles
+            self._mtime = os.path.getmtime(self.path)
+
+    def _reload_if_changed(self) -> None:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path) as f:
+                self._profiles = json.load(f)
+            self._mtime = mtime
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load tuning profiles from {self.path}: {str(e)}")
+
+
+profile_store = ProfileStore()
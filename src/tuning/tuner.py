@@ -0,0 +1,155 @@
+"""
+Benchmark candidate Ollama option sets per model and store the best profile.
+
+    python -m src.tuning llama3.2 qwen3:8b
+    python -m src.tuning llama3.2 --num-ctx 16384 --num-thread 4 8 --objective ttft
+
+Only num_batch and num_thread are searched. num_ctx is the context capacity
+every chat with the model gets, not a speed setting (a smaller window always
+benchmarks faster), so it is fixed at --num-ctx, raised if needed to fit the
+longest representative prompt plus --num-predict. Every candidate is warmed up
+once (option changes make Ollama reload the model) and then run against each
+prompt. Ollama's own eval timings give tokens/sec; time to first token is
+measured on the client.
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from src.clients.ollama import OllamaClient
+from src.tuning.profiles import profile_store
+from src.utils.logger import logger
+
+DEFAULT_PROMPTS = [
+    "What is the capital of France? Answer in one sentence.",
+    "Write a Python function that merges two sorted lists, with a short explanation.",
+    "Summarize the following notes in three bullet points:\n" + " ".join(
+        f"Note {i}: the quarterly report shows revenue, costs and hiring plans for team {i}."
+        for i in range(60)
+    ),
+]
+
+
+def run_prompt(client: OllamaClient, model: str, prompt: str, options: dict) -> Dict[str, float]:
+    """Run one prompt and return time to first token and generation/prompt throughput."""
+    started = time.perf_counter()
+    ttft = None
+    final: dict = {}
+    response = client.stream_response(model, prompt, options)
+    for line in response.iter_lines():
+        if not line:
+            continue
+        data = json.loads(line)
+        if ttft is None and data.get("response"):
+            ttft = time.perf_counter() - started
+        if data.get("done"):
+            final = data
+    eval_seconds = final.get("eval_duration", 0) / 1e9
+    prompt_seconds = final.get("prompt_eval_duration", 0) / 1e9
+    return {
+        "ttft_seconds": ttft if ttft is not None else time.perf_counter() - started,
+        "tokens_per_second": final.get("eval_count", 0) / eval_seconds if eval_seconds else 0.0,
+        "prompt_tokens_per_second": final.get("prompt_eval_count", 0) / prompt_seconds if prompt_seconds else 0.0,
+    }
+
+
+def benchmark_candidate(
+    client: OllamaClient, model: str, options: dict, prompts: List[str], repeats: int, num_predict: int
+) -> dict:
+    """Average the metrics of a candidate option set over all prompts."""
+    run_options = {**options, "num_predict": num_predict}
+    run_prompt(client, model, prompts[0], run_options)
+    runs = [run_prompt(client, model, prompt, run_options) for prompt in prompts for _ in range(repeats)]
+    return {
+        key: statistics.mean(run[key] for run in runs)
+        for key in ("ttft_seconds", "tokens_per_second", "prompt_tokens_per_second")
+    }
+
+
+def tune_model(
+    client: OllamaClient,
+    model: str,
+    candidates: List[dict],
+    prompts: List[str],
+    objective: str,
+    repeats: int,
+    num_predict: int
+) -> dict:
+    """Benchmark every candidate for a model and save the best one as its profile."""
+    results = []
+    for options in candidates:
+        try:
+            metrics = benchmark_candidate(client, model, options, prompts, repeats, num_predict)
+        except Exception as e:
+            logger.error(f"{model} {options}: failed ({str(e)})")
+            continue
+        logger.info(
+            f"{model} {options}: {metrics['tokens_per_second']:.1f} tok/s, "
+            f"ttft {metrics['ttft_seconds']:.2f}s, prompt {metrics['prompt_tokens_per_second']:.1f} tok/s"
+        )
+        results.append({"options": options, **metrics})
+    if not results:
+        raise RuntimeError(f"No candidate completed for {model}")
+
+    if objective == "ttft":
+        best = min(results, key=lambda r: r["ttft_seconds"])
+    else:
+        best = max(results, key=lambda r: r["tokens_per_second"])
+    profile = {
+        **best,
+        "objective": objective,
+        "tuned_at": datetime.now(timezone.utc).isoformat(),
+        "candidates": len(results),
+    }
+    profile_store.save(model, profile)
+    return profile
+
+
+def required_context(num_ctx: int, prompts: List[str], num_predict: int) -> int:
+    """num_ctx, raised to a multiple of 1024 that fits the longest prompt (~4 chars per token) and its answer."""
+    needed = max(len(prompt) for prompt in prompts) // 4 + num_predict
+    return max(num_ctx, -(-needed // 1024) * 1024)
+
+
+def build_candidates(num_ctx: int, num_batch: List[int], num_thread: List[int]) -> List[dict]:
+    return [
+        {"num_ctx": num_ctx, "num_batch": batch, "num_thread": thread}
+        for batch, thread in itertools.product(num_batch, num_thread)
+    ]
+
+
+def main(argv=None):
+    cores = os.cpu_count() or 4
+    parser = argparse.ArgumentParser(description="Tune Ollama options (num_batch, num_thread) per model.")
+    parser.add_argument("models", nargs="+", help="models to tune")
+    parser.add_argument(
+        "--num-ctx", type=int, default=8192,
+        help="context window to tune at and save; raised to fit the longest prompt plus --num-predict"
+    )
+    parser.add_argument("--num-batch", type=int, nargs="+", default=[128, 256, 512])
+    parser.add_argument("--num-thread", type=int, nargs="+", default=sorted({max(1, cores // 2), cores}))
+    parser.add_argument("--num-predict", type=int, default=128, help="tokens generated per benchmark run")
+    parser.add_argument("--prompts-file", help="JSON list of representative prompts")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--objective", choices=["tps", "ttft"], default="tps")
+    args = parser.parse_args(argv)
+
+    prompts = DEFAULT_PROMPTS
+    if args.prompts_file:
+        with open(args.prompts_file) as f:
+            prompts = json.load(f)
+
+    num_ctx = required_context(args.num_ctx, prompts, args.num_predict)
+    if num_ctx != args.num_ctx:
+        logger.info(f"Raised num_ctx from {args.num_ctx} to {num_ctx} to fit the longest prompt")
+    candidates = build_candidates(num_ctx, args.num_batch, args.num_thread)
+    client = OllamaClient()
+    for model in args.models:
+        profile = tune_model(client, model, candidates, prompts, args.objective, args.repeats, args.num_predict)
+        print(f"{model}: {json.dumps(profile['options'])} "
+              f"({profile['tokens_per_second']:.1f} tok/s, ttft {profile['ttft_seconds']:.2f}s)")
@@ -1,28 +1,215 @@
-from typing import Generator, Union, List, Optional
+from typing import Generator, Union, List, Optional, Tuple
 import gradio as gr
 from src.clients.ollama import OllamaClient
 from src.chat.streamer import ChatStreamer
-from src.chat.utils import prepare_prompt
+from src.chat.utils import prepare_prompt, prepare_chat_messages, history_has_images
+from src.chat.thinking_store import PREVIEW_HINT, UNAVAILABLE_NOTE, thinking_store
+from src.chat.prefill import prefill_manager
+from src.chat.governor import governor
+from src.chat.compaction import compaction_worker
+from src.chat.images import IMAGE_EXTENSIONS, image_side_for
+from src.chat.documents import document_store, with_document_context
+from src.chat.ingest import TEXT_EXTENSIONS
+from src.chat.semantic_cache import semantic_cache, cache_scope
+from src.config import config
 from src.utils.logger import logger
+from src.utils.metrics import metrics
+from src.utils.profiling import maybe_profile
+from src.utils.tracing import start_trace
+
+def split_message(message: Union[str, dict]) -> Tuple[str, List[str]]:
+    """Split a (possibly multimodal) textbox value into its text and attached file paths."""
+    if isinstance(message, str):
+        return message, []
+    files = [f.get("path") if isinstance(f, dict) else f for f in message.get("files") or []]
+    return message.get("text") or "", [f for f in files if f]
+
+def option_overrides(num_ctx: Optional[float] = 0, num_batch: Optional[float] = 0, num_thread: Optional[float] = 0) -> dict:
+    """Per-request Ollama options from the UI; 0 keeps the model's tuned profile or default."""
+    values = {"num_ctx": num_ctx, "num_batch": num_batch, "num_thread": num_thread}
+    return {key: int(value) for key, value in values.items() if value}
 
 def chatbot_response(
-    message: str,
+    message: Union[str, dict],
     history: Optional[List[Union[gr.ChatMessage, dict, list]]],
     selected_model: str,
-    custom_instructions: str = ""
+    custom_instructions: str = "",
+    num_ctx: Optional[float] = 0,
+    num_batch: Optional[float] = 0,
+    num_thread: Optional[float] = 0,
+    request: gr.Request = None
 ) -> Generator[Union[gr.ChatMessage, List[gr.ChatMessage]], None, None]:
     """Handle chat responses with streaming and thinking indicators."""
+    trace = start_trace("chat", model=selected_model, history_messages=len(history or []))
+    session_id = request.session_hash if request else None
+    message, image_paths = split_message(message)
     try:
         client = OllamaClient()
-        prompt = prepare_prompt(history, message, custom_instructions)
+        prefilled = config.PREFILL_ENABLED and prefill_manager.consume(session_id, selected_model)
+        trace.set(prefilled=prefilled)
+        cache_embedding = None
+        has_documents = document_store.has_documents(session_id)
+        if semantic_cache is not None and not history and not image_paths and not has_documents:
+            cache_scope_id = cache_scope(selected_model, custom_instructions)
+            cache_embedding, cached_answer = lookup_semantic_cache(client, message, cache_scope_id, trace)
+            if cached_answer is not None:
+                yield gr.ChatMessage(content=cached_answer, role="assistant")
+                return
+
+        full_history = list(history or [])
+        if config.COMPACTION_ENABLED:
+            history = compaction_worker.apply(session_id, history)
+        history = governor.trim_history(session_id, history)
+        if has_documents:
+            custom_instructions = add_document_context(client, session_id, message, custom_instructions, trace)
+        chat_messages = None
+        with trace.activate(), trace.span("prepare_prompt"):
+            if image_paths or history_has_images(history):
+                chat_messages = prepare_chat_messages(
+                    history, message, custom_instructions, image_paths,
+                    max_image_side=image_side_for(client.get_model_info(selected_model))
+                )
+                prompt = ""
+            else:
+                prompt = prepare_prompt(history, message, custom_instructions)
         
-        streamer = ChatStreamer(client, selected_model, prompt)
-        yield from streamer.stream()
+        # The stream slot is taken by the producer, which outlives this handler if the client disconnects
+        streamer = ChatStreamer(
+            client,
+            selected_model,
+            prompt,
+            trace=trace,
+            options={
+                **governor.generation_options(),
+                **option_overrides(num_ctx, num_batch, num_thread)
+            },
+            deadline=governor.stream_deadline(),
+            messages=chat_messages,
+            session_id=session_id
+        )
+        yield from maybe_profile(streamer.stream())
+
+        if config.COMPACTION_ENABLED and streamer.answer_text:
+            compaction_worker.observe(session_id, full_history, message, streamer.answer_text)
+
+        if cache_embedding is not None and streamer.answer_text and not streamer.truncated:
+            semantic_cache.add(cache_embedding, cache_scope_id, streamer.answer_text)
+
+        if streamer.time_to_first_chunk is not None:
+            label = "prefilled" if prefilled else "cold"
+            metrics.observe(f"ttft_seconds.{label}", streamer.time_to_first_chunk)
+
+        if streamer.thinking_message is not None:
+            record_thinking_metrics(streamer)
         
     except Exception as e:
         error_msg = f"Error: {str(e)}"
         logger.error(error_msg)
+        trace.set(error=error_msg)
         yield gr.ChatMessage(content=error_msg, role="assistant")
+    finally:
+        trace.finish()
+
+def record_thinking_metrics(streamer: ChatStreamer) -> None:
+    """
+    Answer latency of reasoning responses per model, split by whether the thinking budget cut the reasoning short.
+
+    Within one model, "exhausted" responses are the ones the budget changed, so
+    comparing them with "within_budget" (or "unbudgeted") shows what it saves.
+    """
+    if streamer.budget_exhausted:
+        label = "exhausted"
+    else:
+        label = "within_budget" if streamer.thinking_budget is not None else "unbudgeted"
+    if streamer.time_to_answer is not None:
+        metrics.observe(f"time_to_answer_seconds.{streamer.selected_model}.{label}", streamer.time_to_answer)
+    metrics.observe(f"thinking_tokens.{streamer.selected_model}.{label}", streamer.thinking_tokens)
+    if streamer.budget_exhausted:
+        metrics.increment("thinking_budget.exhausted")
+
+def lookup_semantic_cache(client: OllamaClient, message: str, scope: int, trace):
+    """Embed a question and look it up in the semantic cache; returns (embedding, answer)."""
+    try:
+        with trace.span("semantic_cache_lookup"):
+            embedding = client.embed(config.EMBEDDING_MODEL, message)
+            answer = semantic_cache.lookup(embedding, scope)
+    except Exception as e:
+        logger.debug(f"Semantic cache lookup failed: {str(e)}")
+        return None, None
+    metrics.increment("semantic_cache.hits" if answer is not None else "semantic_cache.misses")
+    trace.set(semantic_cache_hit=answer is not None)
+    return embedding, answer
+
+def add_document_context(client: OllamaClient, session_id: str, message: str, custom_instructions: str, trace) -> str:
+    """Add the chunks of the session's documents most relevant to the message to the instructions."""
+    try:
+        with trace.span("document_retrieval"):
+            results = document_store.retrieve(session_id, client, message)
+    except Exception as e:
+        logger.warning(f"Document retrieval failed: {str(e)}")
+        return custom_instructions
+    trace.set(document_chunks=len(results))
+    return with_document_context(custom_instructions, results)
+
+def describe_documents(session_id: Optional[str]) -> str:
+    documents = document_store.documents(session_id)
+    if not documents:
+        return "No documents attached."
+    chunks = sum(document["chunks"] for document in documents)
+    names = ", ".join(document["name"] for document in documents)
+    return f"{len(documents)} document(s), {chunks} chunks: {names}"
+
+def attach_documents(files: Optional[List[str]], request: gr.Request = None) -> str:
+    """Chunk and embed uploaded documents for this session."""
+    if request is None:
+        return describe_documents(None)
+    paths = [f if isinstance(f, str) else f.name for f in files or []]
+    if paths:
+        document_store.attach(request.session_hash, paths)
+    return describe_documents(request.session_hash)
+
+def remove_documents(request: gr.Request = None):
+    """Forget every document attached to this session."""
+    if request is not None:
+        document_store.forget(request.session_hash)
+    return None, describe_documents(None)
+
+def schedule_prefill(
+    message: Union[str, dict],
+    history: Optional[List[Union[gr.ChatMessage, dict, list]]],
+    selected_model: str,
+    custom_instructions: str = "",
+    num_ctx: Optional[float] = 0,
+    num_batch: Optional[float] = 0,
+    num_thread: Optional[float] = 0,
+    request: gr.Request = None
+) -> None:
+    """Warm the model's KV cache with the conversation so far while the user types."""
+    message, image_paths = split_message(message)
+    if not selected_model or not message.strip() or request is None:
+        return
+    if image_paths or history_has_images(history) or document_store.has_documents(request.session_hash):
+        return
+    if config.COMPACTION_ENABLED:
+        history = compaction_worker.apply(request.session_hash, history, record_usage=False)
+    prompt = prepare_prompt(governor.trim_history(None, history), message, custom_instructions)
+    options = option_overrides(num_ctx, num_batch, num_thread)
+    prefill_manager.schedule(request.session_hash, selected_model, prompt, options)
+
+def expand_thinking(history: List[dict], evt: gr.SelectData) -> List[dict]:
+    """Load the full reasoning trace of a clicked thinking message from storage."""
+    message = history[evt.index]
+    metadata = message.get("metadata") or {}
+    key = metadata.get("id")
+    if isinstance(key, str) and key.startswith("think-"):
+        full_text = thinking_store.get(key)
+        if full_text is not None:
+            message["content"] = full_text
+        else:
+            # Dropped from memory past the store's byte cap, with no spill directory to fall back on
+            message["content"] = message["content"].replace(PREVIEW_HINT, UNAVAILABLE_NOTE)
+        metadata["id"] = 0
+    return history
 
 def create_interface() -> gr.Blocks:
     """Create Gradio interface with dynamic model loading."""
@@ -42,36 +229,79 @@ def create_interface() -> gr.Blocks:
             scale=4
         )
 
+        with gr.Accordion("Model options", open=False):
+            gr.Markdown("Leave at 0 to use the model's tuned profile (`python -m src.tuning`) or Ollama's default.")
+            with gr.Row():
+                num_ctx = gr.Number(label="num_ctx", value=0, precision=0, minimum=0)
+                num_batch = gr.Number(label="num_batch", value=0, precision=0, minimum=0)
+                num_thread = gr.Number(label="num_thread", value=0, precision=0, minimum=0)
+
+        with gr.Accordion("Documents", open=False):
+            gr.Markdown("Attached documents are chunked once and only the most relevant parts are added to each prompt.")
+            documents = gr.File(
+                label="Attach documents",
+                file_count="multiple",
+                file_types=sorted(TEXT_EXTENSIONS)
+            )
+            document_status = gr.Markdown("No documents attached.")
+            remove_documents_btn = gr.Button("Remove documents")
+
+        chatbot = gr.Chatbot(
+            type="messages",
+            render_markdown=True,
+            placeholder="Your AI Assistant Ready to Help!",
+            layout="bubble",
+            render=False
+        )
+
         with gr.Row():
-            gr.ChatInterface(
+            chat_interface = gr.ChatInterface(
                 fn=chatbot_response,
-                additional_inputs=[model_dropdown, custom_instructions],
-                chatbot=gr.Chatbot(
-                    render_markdown=True,
-                    placeholder="Your AI Assistant Ready to Help!",
-                    layout="bubble"
-                ),
+                additional_inputs=[model_dropdown, custom_instructions, num_ctx, num_batch, num_thread],
+                chatbot=chatbot,
                 type="messages",
+                multimodal=True,
+                textbox=gr.MultimodalTextbox(file_types=sorted(IMAGE_EXTENSIONS), file_count="multiple", render=False),
                 title="Local Ollama Chat",
                 description="Chat with locally running Ollama models",
                 example_labels=["Introduction", "Poetry"],
                 examples=[
-                    ["Who are you? What is your name?"],
-                    ["Write a poem about artificial intelligence"]
+                    [{"text": "Who are you? What is your name?"}],
+                    [{"text": "Write a poem about artificial intelligence"}]
                 ],
                 cache_examples=False,
                 analytics_enabled=False
             )
 
-        def load_models():
+        chatbot.select(expand_thinking, inputs=chatbot, outputs=chatbot)
+        documents.upload(attach_documents, inputs=documents, outputs=document_status)
+        remove_documents_btn.click(remove_documents, outputs=[documents, document_status])
+
+        if config.PREFILL_ENABLED:
+            chat_interface.textbox.change(
+                schedule_prefill,
+                inputs=[
+                    chat_interface.textbox, chatbot, model_dropdown, custom_instructions,
+                    num_ctx, num_batch, num_thread
+                ],
+                queue=False,
+                show_progress="hidden",
+                trigger_mode="always_last"
+            )
+
+        def load_models(use_cache: bool = True):
             """Refresh available models in dropdown."""
-            models = OllamaClient().fetch_models()
+            models = OllamaClient().fetch_models(use_cache=use_cache)
             return gr.Dropdown(
                 choices=models,
                 value=models[0] if models else None
             )
 
         demo.load(load_models, outputs=model_dropdown)
-        refresh_btn.click(load_models, outputs=model_dropdown)
+        refresh_btn.click(lambda: load_models(use_cache=False), outputs=model_dropdown)
 
+    demo.queue(
+        default_concurrency_limit=config.MAX_CONCURRENT_STREAMS,
+        max_size=config.QUEUE_MAX_SIZE
+    )
     return demo
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""
+In-process counters and latency samples exposed on /api/metrics.
+"""
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict
+
+
+class Metrics:
+    """Thread-safe counters and bounded sample windows keyed by metric name."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(value)
+
+    def summary(self, name: str) -> dict:
+        """Count, mean and percentiles over the most recent samples of a metric."""
+        with self._lock:
+            values = sorted(self._samples.get(name, ()))
+        if not values:
+            return {"count": 0}
+        return {
+            "count": len(values),
+            "mean": sum(values) / len(values),
+            "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            names = list(self._samples)
+        return {
+            "counters": counters,
+            "samples": {name: self.summary(name) for name in names},
+        }
+
+
+metrics = Metrics()
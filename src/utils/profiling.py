@@ -0,0 +1,248 @@
+"""
+On-demand profiling of a live process: stack sampling, cProfile over chat
+requests, and tracemalloc allocation snapshots of the streaming path.
+
+Nothing here runs until an admin asks for it. The only hooks on the hot path are
+maybe_profile() and maybe_profile_producer(), which return the response stream
+and its Ollama producer unchanged unless a cProfile session is currently
+collecting requests.
+"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Generator, List, Optional
+
+STREAMING_PATH_FILTERS = [
+    tracemalloc.Filter(True, os.path.join("*", "src", "chat", "*")),
+    tracemalloc.Filter(True, os.path.join("*", "src", "clients", "*")),
+    tracemalloc.Filter(True, os.path.join("*", "src", "ui", "*")),
+]
+
+_profile_lock = threading.Lock()
+
+
+class ProfilingBusyError(Exception):
+    """Raised when another profiling session is already running."""
+
+
+class _RequestProfiler:
+    """cProfile session that profiles up to max_requests chat requests, one at a time."""
+
+    def __init__(self, max_requests: int):
+        self.profile = cProfile.Profile()
+        self.producer_profiles: List[cProfile.Profile] = []
+        self.stats: Optional[pstats.Stats] = None
+        self.remaining = max_requests
+        self.completed = 0
+        self.busy = False
+        self.closed = False
+        self.steps_running = 0
+        self.stepping_thread: Optional[int] = None
+        self.done = threading.Event()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.lock = threading.Lock()
+        self.steps_done = threading.Condition(self.lock)
+
+    def begin_step(self, profile: cProfile.Profile) -> bool:
+        """Enable a profile for one generator step, unless the session is closed."""
+        with self.lock:
+            if self.closed:
+                return False
+            self.steps_running += 1
+            if profile is self.profile:
+                self.stepping_thread = threading.get_ident()
+        profile.enable()
+        return True
+
+    def end_step(self, profile: cProfile.Profile) -> None:
+        profile.disable()
+        with self.lock:
+            self.steps_running -= 1
+            if profile is self.profile:
+                self.stepping_thread = None
+            self.steps_done.notify_all()
+
+
+_active_profiler: Optional[_RequestProfiler] = None
+
+
+def maybe_profile(gen: Generator) -> Generator:
+    """Profile a response stream if a cProfile session is collecting requests."""
+    session = _active_profiler
+    if session is None:
+        return gen
+    return _profiled(gen, session)
+
+
+def maybe_profile_producer(producer: Callable[[], Generator]) -> Callable[[], Generator]:
+    """
+    Profile a stream producer started by the request being profiled.
+
+    Producers read from Ollama in their own thread, so they get their own
+    cProfile.Profile (one profiler must not run in two threads at once), merged
+    into the session's stats when it is collected.
+    """
+    session = _active_profiler
+    if session is None:
+        return producer
+    with session.lock:
+        if session.closed or session.stepping_thread != threading.get_ident():
+            return producer
+        profile = cProfile.Profile()
+        session.producer_profiles.append(profile)
+    return lambda: _profile_steps(producer(), session, profile)
+
+
+def _profile_steps(gen: Generator, session: _RequestProfiler, profile: cProfile.Profile) -> Generator:
+    """Run a generator with a profile enabled around each step, returning its return value."""
+    try:
+        while True:
+            # The generator may resume on a different worker thread each step,
+            # so the profiler is enabled around each step rather than once.
+            # Once the session is closed its stats are being collected, so the
+            # rest of the stream runs unprofiled.
+            if not session.begin_step(profile):
+                break
+            try:
+                item = next(gen)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                session.end_step(profile)
+            yield item
+        return (yield from gen)
+    finally:
+        gen.close()
+
+
+def _profiled(gen: Generator, session: _RequestProfiler) -> Generator:
+    with session.lock:
+        claimed = not session.busy and session.remaining > 0 and not session.done.is_set()
+        if claimed:
+            session.busy = True
+            session.idle.clear()
+            session.remaining -= 1
+    if not claimed:
+        yield from gen
+        return
+
+    try:
+        yield from _profile_steps(gen, session, session.profile)
+    finally:
+        with session.lock:
+            session.busy = False
+            session.completed += 1
+            session.idle.set()
+            if session.remaining <= 0:
+                session.done.set()
+
+
+def profile_requests(max_requests: int, seconds: float) -> _RequestProfiler:
+    """Collect cProfile data for the next max_requests chat requests, or until seconds pass."""
+    global _active_profiler
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilingBusyError("A profiling session is already running")
+    try:
+        session = _RequestProfiler(max_requests)
+        _active_profiler = session
+        session.done.wait(seconds)
+        session.done.set()
+        _active_profiler = None
+        session.idle.wait(timeout=30)
+        with session.lock:
+            session.closed = True
+            session.steps_done.wait_for(lambda: session.steps_running == 0, timeout=30)
+        session.stats = _merged_stats(session)
+        return session
+    finally:
+        _active_profiler = None
+        _profile_lock.release()
+
+
+def _merged_stats(session: _RequestProfiler) -> Optional[pstats.Stats]:
+    """The request handlers' and their stream producers' stats combined."""
+    profiles = [session.profile, *session.producer_profiles]
+    for profile in profiles:
+        profile.create_stats()
+    profiles = [profile for profile in profiles if profile.stats]
+    if not profiles:
+        return None
+    stats = pstats.Stats(profiles[0])
+    if len(profiles) > 1:
+        stats.add(*profiles[1:])
+    return stats
+
+
+def format_pstats(session: _RequestProfiler, sort: str = "cumulative", limit: int = 50) -> str:
+    if session.stats is None:
+        return "No requests were profiled."
+    output = io.StringIO()
+    session.stats.stream = output
+    session.stats.sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+def dump_pstats(session: _RequestProfiler) -> bytes:
+    """Serialize stats in the format written by pstats.Stats.dump_stats()."""
+    return marshal.dumps(session.stats.stats if session.stats is not None else {})
+
+
+def sample_stacks(seconds: float, interval: float = 0.01) -> str:
+    """Sample every thread's stack for a while and return them in collapsed (flamegraph) format."""
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilingBusyError("A profiling session is already running")
+    try:
+        own_thread = threading.get_ident()
+        counts: Counter = Counter()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_thread:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                counts[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+        return "\n".join(f"{stack} {count}" for stack, count in counts.most_common())
+    finally:
+        _profile_lock.release()
+
+
+@contextmanager
+def track_allocations(top: int = 25):
+    """
+    Record allocations made in the streaming path while the block runs.
+
+    Yields a list that is filled with the top allocation sites when the block exits.
+    """
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(10)
+    results: List[dict] = []
+    try:
+        yield results
+        snapshot = tracemalloc.take_snapshot().filter_traces(STREAMING_PATH_FILTERS)
+        for stat in snapshot.statistics("lineno")[:top]:
+            frame = stat.traceback[0]
+            results.append({
+                "location": f"{frame.filename}:{frame.lineno}",
+                "size_bytes": stat.size,
+                "count": stat.count,
+            })
+    finally:
+        if started_here:
+            tracemalloc.stop()
@@ -0,0 +1,190 @@
+"""
+Lightweight per-request tracing for the chat pipeline.
+
+A sampled request gets a Trace that records span timings and point events and
+emits them as one structured JSON log line when finished, optionally exporting
+the spans to an OpenTelemetry collector. Unsampled requests get NULL_TRACE,
+whose methods do nothing, so the hot path only pays for a random() call.
+"""
+import contextvars
+import json
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from src.config import config
+from src.utils.logger import logger
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+_otel_tracer = None
+
+
+class Trace:
+    """Span timings, events and counters collected for one chat request."""
+
+    def __init__(self, name: str, **attrs: Any):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attrs: Dict[str, Any] = attrs
+        self.start_wall_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.events: List[Dict[str, Any]] = []
+        self.totals: Dict[str, Dict[str, float]] = {}
+        self._finished = False
+
+    def _offset_ms(self, at: Optional[float] = None) -> float:
+        return round(((at or time.perf_counter()) - self._start) * 1000, 3)
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any):
+        """Time a block of code as a named span."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.spans.append({
+                "name": name,
+                "start_ms": self._offset_ms(start),
+                "duration_ms": round((end - start) * 1000, 3),
+                **attrs,
+            })
+
+    def event(self, name: str, **attrs: Any) -> None:
+        """Record a point in time, such as the first chunk arriving."""
+        self.events.append({"name": name, "at_ms": self._offset_ms(), **attrs})
+
+    def accumulate(self, name: str, seconds: float) -> None:
+        """Add to a running total for work repeated many times per request."""
+        total = self.totals.setdefault(name, {"count": 0, "duration_ms": 0.0})
+        total["count"] += 1
+        total["duration_ms"] += seconds * 1000
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    @contextmanager
+    def activate(self):
+        """Make this trace current so nested helpers can add spans via span()."""
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def finish(self) -> None:
+        """Emit the trace as a JSON log line and export it if OpenTelemetry is configured."""
+        if self._finished:
+            return
+        self._finished = True
+        for total in self.totals.values():
+            total["duration_ms"] = round(total["duration_ms"], 3)
+        record = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "duration_ms": self._offset_ms(),
+            "attrs": self.attrs,
+            "spans": self.spans,
+            "events": self.events,
+            "totals": self.totals,
+        }
+        logger.info(json.dumps(record, default=str))
+        if config.OTEL_EXPORTER_OTLP_ENDPOINT:
+            _export_otel(self, record["duration_ms"])
+
+
+class _NullTrace:
+    """Stand-in for unsampled requests; every method is a no-op."""
+
+    trace_id = None
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any):
+        yield
+
+    def event(self, name: str, **attrs: Any) -> None:
+        pass
+
+    def accumulate(self, name: str, seconds: float) -> None:
+        pass
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    @contextmanager
+    def activate(self):
+        yield self
+
+    def finish(self) -> None:
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+def start_trace(name: str, **attrs: Any):
+    """Start a trace for this request if it falls within TRACE_SAMPLE_RATE."""
+    if config.TRACE_SAMPLE_RATE <= 0 or random.random() >= config.TRACE_SAMPLE_RATE:
+        return NULL_TRACE
+    return Trace(name, **attrs)
+
+
+def span(name: str, **attrs: Any):
+    """Time a block as a span of the current trace, if there is one."""
+    trace = _current_trace.get()
+    if trace is None:
+        return NULL_TRACE.span(name)
+    return trace.span(name, **attrs)
+
+
+def _get_otel_tracer():
+    """Set up the OpenTelemetry exporter on first use; None if it is not installed."""
+    global _otel_tracer
+    if _otel_tracer is None:
+        try:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry is not installed")
+            _otel_tracer = False
+            return None
+        provider = TracerProvider(resource=Resource.create({"service.name": "ollama-chat"}))
+        exporter = OTLPSpanExporter(endpoint=f"{config.OTEL_EXPORTER_OTLP_ENDPOINT.rstrip('/')}/v1/traces")
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        _otel_tracer = provider.get_tracer("ollama-chat")
+    return _otel_tracer or None
+
+
+def _export_otel(trace: Trace, duration_ms: float) -> None:
+    """Replay a finished trace as OpenTelemetry spans with their original timestamps."""
+    tracer = _get_otel_tracer()
+    if tracer is None:
+        return
+    from opentelemetry import trace as otel_trace
+
+    def to_ns(offset_ms: float) -> int:
+        return trace.start_wall_ns + int(offset_ms * 1_000_000)
+
+    def clean(attrs: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v if isinstance(v, (str, bool, int, float)) else str(v) for k, v in attrs.items()}
+
+    root = tracer.start_span(trace.name, start_time=trace.start_wall_ns, attributes=clean(trace.attrs))
+    context = otel_trace.set_span_in_context(root)
+    for item in trace.spans:
+        attrs = {k: v for k, v in item.items() if k not in ("name", "start_ms", "duration_ms")}
+        child = tracer.start_span(
+            item["name"], context=context, start_time=to_ns(item["start_ms"]), attributes=clean(attrs)
+        )
+        child.end(end_time=to_ns(item["start_ms"] + item["duration_ms"]))
+    for item in trace.events:
+        attrs = {k: v for k, v in item.items() if k not in ("name", "at_ms")}
+        root.add_event(item["name"], attributes=clean(attrs), timestamp=to_ns(item["at_ms"]))
+    for name, total in trace.totals.items():
+        root.set_attribute(f"{name}.count", total["count"])
+        root.set_attribute(f"{name}.duration_ms", total["duration_ms"])
+    root.end(end_time=to_ns(duration_ms))